@@ -1,6 +1,30 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        if settings.REQUEST_METRICS_ENABLED:
+            self.instrument()
+
+    @staticmethod
+    def instrument():
+        """Время сериализаторов и рендереров для RequestMetricsMiddleware."""
+        from rest_framework.renderers import JSONRenderer
+        from rest_framework.serializers import ListSerializer, Serializer
+        from rest_framework.settings import api_settings
+
+        from .metrics import instrument_classes
+        from .serializers import RecipeFastReadSerializer
+
+        instrument_classes(
+            (Serializer, ListSerializer, RecipeFastReadSerializer),
+            'data', 'serialize'
+        )
+        instrument_classes(
+            (JSONRenderer, *api_settings.DEFAULT_RENDERER_CLASSES),
+            'render', 'render'
+        )
@@ -0,0 +1,181 @@
+import binascii
+import uuid
+from base64 import b64decode
+from tempfile import SpooledTemporaryFile
+
+import filetype
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
+from rest_framework import serializers
+
+BASE64_HEADER_SEPARATOR = ';base64,'
+BASE64_CHUNK_SIZE = 64 * 1024
+BASE64_WHITESPACE = b' \t\r\n'
+MAGIC_BYTES_SIZE = 261
+IMAGE_EXTENSIONS = {
+    'jpg': 'jpg',
+    'png': 'png',
+    'gif': 'gif',
+    'webp': 'webp',
+}
+
+INVALID_BASE64 = 'Изображение должно быть строкой base64'
+INVALID_IMAGE_TYPE = (
+    'Допустимые форматы изображения: {types}'
+)
+IMAGE_TOO_LARGE = (
+    'Размер изображения не должен превышать {size} МБ'
+)
+IMAGE_DIMENSIONS_TOO_LARGE = (
+    'Изображение не должно быть больше {side}px по стороне '
+    'и {pixels} Мпикс'
+)
+INVALID_IMAGE = 'Загрузите корректное изображение'
+
+
+def iter_base64_chunks(data, start=0, chunk_size=BASE64_CHUNK_SIZE):
+    """
+    Декодирует base64-строку data начиная с позиции start
+    кусками примерно по chunk_size символов.
+    """
+    pending = b''
+    for position in range(start, len(data), chunk_size):
+        chunk = pending + data[position:position + chunk_size].encode(
+            'ascii'
+        ).translate(None, BASE64_WHITESPACE)
+        aligned = len(chunk) // 4 * 4
+        pending = chunk[aligned:]
+        if aligned:
+            yield b64decode(chunk[:aligned], validate=True)
+    if pending:
+        raise binascii.Error('Incorrect padding')
+
+
+class StreamingBase64ImageField(serializers.ImageField):
+    """
+    Изображение в виде строки base64 (можно с заголовком data:...).
+    Строка декодируется по частям во временный файл, который
+    остается в памяти до FILE_UPLOAD_MAX_MEMORY_SIZE байт. Тип по
+    сигнатуре, размер и разрешение проверяются до полного
+    декодирования, поэтому слишком большие изображения
+    отклоняются сразу.
+    """
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str) or not data:
+            raise serializers.ValidationError(INVALID_BASE64)
+        start = data.find(BASE64_HEADER_SEPARATOR, 0, 100)
+        start = 0 if start == -1 else start + len(BASE64_HEADER_SEPARATOR)
+        max_size = settings.IMAGE_UPLOAD_MAX_SIZE
+        if (len(data) - start) // 4 * 3 > max_size + 2:
+            self.fail_too_large()
+        file = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        try:
+            extension = self.decode(data, start, file)
+            image_format = self.verify(file)
+        except Exception:
+            file.close()
+            raise
+        size = file.tell()
+        file.seek(0)
+        # ImageField.to_internal_value прочитал бы файл в память целиком.
+        return serializers.FileField.to_internal_value(self, UploadedFile(
+            file=file,
+            name=f'{uuid.uuid4()}.{extension}',
+            content_type=Image.MIME.get(image_format),
+            size=size
+        ))
+
+    def decode(self, data, start, file):
+        """
+        Пишет декодированное изображение в file и возвращает
+        его расширение. Размеры изображения проверяются, как только
+        декодирован его заголовок.
+        """
+        extension = None
+        size = 0
+        probe_size = MAGIC_BYTES_SIZE
+        try:
+            for chunk in iter_base64_chunks(data, start):
+                file.write(chunk)
+                size += len(chunk)
+                if size > settings.IMAGE_UPLOAD_MAX_SIZE:
+                    self.fail_too_large()
+                if extension is None and size >= MAGIC_BYTES_SIZE:
+                    extension = self.get_extension(file)
+                if probe_size is not None and size >= probe_size:
+                    probe_size = (
+                        None if self.check_dimensions(file)
+                        else probe_size * 2
+                    )
+        except (binascii.Error, UnicodeEncodeError, ValueError):
+            raise serializers.ValidationError(INVALID_BASE64)
+        if extension is None:
+            extension = self.get_extension(file)
+        if probe_size is not None and not self.check_dimensions(file):
+            raise serializers.ValidationError(INVALID_IMAGE)
+        return extension
+
+    @staticmethod
+    def get_extension(file):
+        file.seek(0)
+        head = file.read(MAGIC_BYTES_SIZE)
+        file.seek(0, 2)
+        extension = filetype.guess_extension(head)
+        if extension not in IMAGE_EXTENSIONS:
+            raise serializers.ValidationError(
+                INVALID_IMAGE_TYPE.format(
+                    types=', '.join(IMAGE_EXTENSIONS)
+                )
+            )
+        return IMAGE_EXTENSIONS[extension]
+
+    @staticmethod
+    def check_dimensions(file):
+        """
+        Проверяет разрешение по заголовку изображения.
+        False, если заголовок еще не декодирован целиком.
+        """
+        file.seek(0)
+        try:
+            width, height = Image.open(file).size
+        except Image.DecompressionBombError:
+            width = height = settings.IMAGE_UPLOAD_MAX_SIDE + 1
+        except Exception:
+            return False
+        finally:
+            file.seek(0, 2)
+        if (
+            max(width, height) > settings.IMAGE_UPLOAD_MAX_SIDE
+            or width * height > settings.IMAGE_UPLOAD_MAX_PIXELS
+        ):
+            raise serializers.ValidationError(
+                IMAGE_DIMENSIONS_TOO_LARGE.format(
+                    side=settings.IMAGE_UPLOAD_MAX_SIDE,
+                    pixels=settings.IMAGE_UPLOAD_MAX_PIXELS // 10 ** 6
+                )
+            )
+        return True
+
+    @staticmethod
+    def verify(file):
+        """Проверяет целостность изображения, не загружая пиксели."""
+        file.seek(0)
+        try:
+            image = Image.open(file)
+            image.verify()
+        except Exception:
+            raise serializers.ValidationError(INVALID_IMAGE)
+        finally:
+            file.seek(0, 2)
+        return image.format
+
+    def fail_too_large(self):
+        raise serializers.ValidationError(
+            IMAGE_TOO_LARGE.format(
+                size=settings.IMAGE_UPLOAD_MAX_SIZE // 1024 ** 2
+            )
+        )
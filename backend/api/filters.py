@@ -1,19 +1,45 @@
+from django.conf import settings
 from rest_framework.filters import SearchFilter
 from django_filters import rest_framework as filters
-from django.db.models import Q
+from django.db.models import Exists, OuterRef
 
-from recipes.models import Recipe, Tag
+from recipes.catalogues import get_tags_ids
+from recipes.models import Favorite, Recipe, ShoppingCart
+from recipes.search import search_ingredients
+
+TAGS_MATCH_ANY = 'any'
+TAGS_MATCH_ALL = 'all'
 
 
 class IngredientsSearchFilter(SearchFilter):
     search_param = 'name'
 
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query or view.action != 'list':
+            return queryset
+        return search_ingredients(
+            ingredients=queryset,
+            query=query,
+            limit=settings.INGREDIENTS_SEARCH_LIMIT
+        )
+
+
+def get_tags_choices():
+    return [(slug, slug) for slug in get_tags_ids()]
+
 
 class RecipesFilter(filters.FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all()
+    tags = filters.MultipleChoiceFilter(
+        choices=get_tags_choices,
+        method='get_tags_recipes'
+    )
+    tags_match = filters.ChoiceFilter(
+        choices=(
+            (TAGS_MATCH_ANY, 'Хотя бы один из тегов'),
+            (TAGS_MATCH_ALL, 'Все теги'),
+        ),
+        method='get_tags_match_recipes'
     )
     is_favorited = filters.BooleanFilter(
         method='get_recipes'
@@ -29,11 +55,46 @@ class RecipesFilter(filters.FilterSet):
             'author'
         )
 
+    def get_tags_recipes(self, recipes, name, value):
+        """
+        Фильтр по тегам через EXISTS: рецепт попадает в выборку
+        один раз, сколько бы тегов ни совпало, и DISTINCT не нужен.
+        """
+        tags_ids = get_tags_ids()
+        recipe_tags = Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk')
+        )
+        if self.form.cleaned_data.get('tags_match') == TAGS_MATCH_ALL:
+            for slug in value:
+                recipes = recipes.filter(
+                    Exists(recipe_tags.filter(tag=tags_ids[slug]))
+                )
+            return recipes
+        return recipes.filter(
+            Exists(
+                recipe_tags.filter(
+                    tag__in=[tags_ids[slug] for slug in value]
+                )
+            )
+        )
+
+    def get_tags_match_recipes(self, recipes, name, value):
+        return recipes
+
     def get_recipes(self, recipes, name, value):
-        if self.request.auth is None or not value:
-            return recipes.objects.none()
-        user = self.request.user
-        related_filter = Q(shoppingcarts__user=user)
+        """
+        True — только рецепты в избранном (корзине) пользователя,
+        False — только рецепты не из них. У анонимного пользователя
+        их нет: True дает пустую выборку, False ничего не фильтрует.
+        """
+        if self.request.auth is None:
+            return recipes if not value else recipes.none()
+        model = ShoppingCart
         if name == 'is_favorited':
-            related_filter = Q(favorites__user=user)
-        return recipes.filter(related_filter)
+            model = Favorite
+        user_recipes = Exists(
+            model.objects.filter(
+                user=self.request.user, recipe=OuterRef('pk')
+            )
+        )
+        return recipes.filter(user_recipes if value else ~user_recipes)
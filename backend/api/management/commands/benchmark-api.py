@@ -0,0 +1,468 @@
+import base64
+import io
+import json
+import statistics
+import tempfile
+import time
+from dataclasses import dataclass, field
+from itertools import count
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Exists, OuterRef
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+import requests
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, Subscriptions, Tag, User
+
+DEFAULT_REPEAT = 50
+DEFAULT_WARMUP = 3
+DEFAULT_TOLERANCE = 20
+INGREDIENTS_SEARCH = 'мо'
+SUBSCRIPTIONS_RECIPES_LIMIT = 3
+PERCENTILES = (50, 95, 99)
+LATENCY_KEY = 'p95'
+COLD_SUFFIX = ' (cold)'
+
+
+def clear_caches():
+    for cache in caches.all():
+        cache.clear()
+
+
+def get_image_code():
+    buffer = io.BytesIO()
+    Image.new('RGB', (16, 16), (200, 120, 40)).save(buffer, 'PNG')
+    return (
+        'data:image/png;base64,'
+        + base64.b64encode(buffer.getvalue()).decode()
+    )
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: str
+    params: dict = field(default_factory=dict)
+    auth: bool = False
+    payload: object = None
+
+
+@dataclass
+class Dataset:
+    """Объекты БД, на которых гоняются сценарии."""
+    user: User
+    token: str
+    tag: str
+    author_id: int
+    recipe_id: int
+    ingredients_ids: list
+    tags_ids: list
+
+    @classmethod
+    def load(cls):
+        """
+        Пользователь — с самой большой корзиной среди тех, у кого есть
+        подписки (если подписок нет ни у кого — среди всех).
+        """
+        users = User.objects.annotate(
+            cart_size=Count('shoppingcarts')
+        ).order_by('-cart_size', 'id')
+        user = users.filter(
+            Exists(Subscriptions.objects.filter(user=OuterRef('pk')))
+        ).first() or users.first()
+        recipe = Recipe.objects.order_by('-pub_date', '-id').first()
+        if user is None or recipe is None:
+            raise CommandError(
+                'В БД нет данных: выполните import-data или '
+                'generate-fixtures'
+            )
+        author_id = Recipe.objects.values('author').annotate(
+            recipes_number=Count('id')
+        ).order_by('-recipes_number', 'author').values_list(
+            'author', flat=True
+        ).first()
+        tags = list(Tag.objects.order_by('id')[:2])
+        return cls(
+            user=user,
+            token=Token.objects.get_or_create(user=user)[0].key,
+            tag=tags[0].slug,
+            author_id=author_id,
+            recipe_id=recipe.id,
+            ingredients_ids=list(
+                Ingredient.objects.order_by('id').values_list(
+                    'id', flat=True
+                )[:3]
+            ),
+            tags_ids=[tag.id for tag in tags],
+        )
+
+
+def get_read_scenarios(data):
+    recipe = f'/api/recipes/{data.recipe_id}/'
+    return [
+        Scenario('recipes', 'get', '/api/recipes/'),
+        Scenario('recipes auth', 'get', '/api/recipes/', auth=True),
+        Scenario(
+            'recipes limit=50', 'get', '/api/recipes/', {'limit': 50},
+            auth=True
+        ),
+        Scenario(
+            'recipes tags', 'get', '/api/recipes/', {'tags': data.tag},
+            auth=True
+        ),
+        Scenario(
+            'recipes author', 'get', '/api/recipes/',
+            {'author': data.author_id}, auth=True
+        ),
+        Scenario(
+            'recipes is_favorited', 'get', '/api/recipes/',
+            {'is_favorited': 1}, auth=True
+        ),
+        Scenario(
+            'recipes is_in_shopping_cart', 'get', '/api/recipes/',
+            {'is_in_shopping_cart': 1}, auth=True
+        ),
+        Scenario('recipe', 'get', recipe),
+        Scenario('recipe auth', 'get', recipe, auth=True),
+        Scenario(
+            'subscriptions', 'get', '/api/users/subscriptions/',
+            {'recipes_limit': SUBSCRIPTIONS_RECIPES_LIMIT}, auth=True
+        ),
+        Scenario(
+            'ingredients search', 'get', '/api/ingredients/',
+            {'name': INGREDIENTS_SEARCH}
+        ),
+        Scenario(
+            'download shopping cart', 'get',
+            '/api/recipes/download_shopping_cart/', auth=True
+        ),
+    ]
+
+
+def get_recipe_payload(data, name):
+    return {
+        'ingredients': [
+            {'id': ingredient_id, 'amount': 10}
+            for ingredient_id in data.ingredients_ids
+        ],
+        'tags': data.tags_ids,
+        'image': get_image_code(),
+        'name': name,
+        'text': 'Рецепт для замеров',
+        'cooking_time': 10,
+    }
+
+
+def get_percentile(values, percent):
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[
+        percent - 1
+    ]
+
+
+def summarize(timings, queries, sizes, statuses):
+    result = {
+        f'p{percent}': round(get_percentile(timings, percent), 2)
+        for percent in PERCENTILES
+    }
+    result['queries'] = max(queries) if queries else None
+    result['bytes'] = max(sizes)
+    result['status'] = sorted(set(statuses))
+    return result
+
+
+class InProcessClient:
+    """Тестовый клиент Django в процессе, со счетчиком запросов к БД."""
+    counts_queries = True
+
+    def __init__(self, token):
+        self.client = Client()
+        self.headers = {'HTTP_AUTHORIZATION': f'Token {token}'}
+
+    def request(self, scenario, payload=None):
+        kwargs = dict(self.headers) if scenario.auth else {}
+        if payload is not None:
+            kwargs.update(
+                data=json.dumps(payload), content_type='application/json'
+            )
+        elif scenario.params:
+            kwargs['data'] = scenario.params
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = getattr(self.client, scenario.method)(
+                scenario.path, **kwargs
+            )
+            content = (
+                b''.join(response.streaming_content)
+                if response.streaming else response.content
+            )
+            elapsed = time.perf_counter() - start
+        return elapsed, len(queries), content, response.status_code
+
+
+class HTTPClient:
+    """Запросы к запущенному серверу (gunicorn) по адресу url."""
+    counts_queries = False
+
+    def __init__(self, token, url):
+        self.session = requests.Session()
+        self.url = url.rstrip('/')
+        self.headers = {'Authorization': f'Token {token}'}
+
+    def request(self, scenario, payload=None):
+        start = time.perf_counter()
+        response = self.session.request(
+            scenario.method,
+            self.url + scenario.path,
+            params=scenario.params,
+            json=payload,
+            headers=self.headers if scenario.auth else None
+        )
+        content = response.content
+        return (
+            time.perf_counter() - start, None, content, response.status_code
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        'This command benchmarks the hot API endpoints on the current '
+        'database, in process with the Django test client or against a '
+        'running server (--url), and reports latency percentiles, SQL '
+        'queries and bytes per request. In process every read scenario '
+        'is also measured cold, with the Django caches cleared before '
+        'each request. --output saves the results, --baseline compares '
+        'them with saved ones.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=DEFAULT_REPEAT,
+            help='Число замеров на сценарий'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=DEFAULT_WARMUP,
+            help='Число запросов на сценарий до замеров'
+        )
+        parser.add_argument(
+            '--url',
+            help='Адрес запущенного сервера, например '
+                 'http://127.0.0.1:8000 (без него — в процессе)'
+        )
+        parser.add_argument(
+            '--only', nargs='+', default=(),
+            help='Только сценарии, в названии которых есть эти слова'
+        )
+        parser.add_argument(
+            '--no-writes', action='store_true',
+            help='Без сценариев создания и изменения рецепта'
+        )
+        parser.add_argument(
+            '--no-cold', action='store_true',
+            help='Без замеров с очищенными кэшами (они очищают и общий '
+                 'кэш RESPONSE_CACHE_BACKEND, если он настроен)'
+        )
+        parser.add_argument(
+            '--output', help='JSON-файл для записи результатов'
+        )
+        parser.add_argument(
+            '--baseline', help='JSON-файл с результатами для сравнения'
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=DEFAULT_TOLERANCE,
+            help='Допустимый рост p95, %% (по умолчанию '
+                 f'{DEFAULT_TOLERANCE})'
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        data = Dataset.load()
+        if options['url']:
+            client = HTTPClient(data.token, options['url'])
+            results = self.run(client, data)
+        else:
+            client = InProcessClient(data.token)
+            with tempfile.TemporaryDirectory() as media_root:
+                with override_settings(
+                    ALLOWED_HOSTS=['testserver'], MEDIA_ROOT=media_root
+                ):
+                    with transaction.atomic():
+                        results = self.run(client, data)
+                        transaction.set_rollback(True)
+        self.report(results, client.counts_queries)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf8') as file:
+                json.dump(
+                    {
+                        'vendor': connection.vendor,
+                        'url': options['url'],
+                        'repeat': options['repeat'],
+                        'results': results,
+                    },
+                    file, ensure_ascii=False, indent=2
+                )
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf8') as file:
+                baseline = json.load(file)['results']
+            errors = self.compare(results, baseline)
+            if errors:
+                raise CommandError('\n'.join(errors))
+            print('Регрессий относительно базовых результатов нет')
+        failed = [name for name, result in results.items() if 'error' in result]
+        if failed:
+            raise CommandError(f'Сценарии с ошибками: {", ".join(failed)}')
+
+    def selected(self, name):
+        only = self.options['only']
+        return not only or any(word in name for word in only)
+
+    def measure(self, client, scenario, payloads=None, cold=False):
+        """
+        Замеры сценария; при cold перед каждым запросом очищаются
+        кэши Django (ответы, фрагменты рецептов, версии, счетчики), и
+        в числе запросов к БД видна вся работа сериализаторов. Ошибка
+        записывается в результат сценария (его изменения в БД
+        откатываются до точки сохранения), и остальные сценарии
+        выполняются дальше.
+        """
+        timings, queries, sizes, statuses = [], [], [], []
+        payloads = payloads or (lambda: scenario.payload)
+        try:
+            with transaction.atomic():
+                for num in range(
+                    self.options['warmup'] + self.options['repeat']
+                ):
+                    if cold:
+                        clear_caches()
+                    elapsed, queries_number, content, status = (
+                        client.request(scenario, payloads())
+                    )
+                    if num < self.options['warmup']:
+                        continue
+                    timings.append(elapsed * 1000)
+                    if queries_number is not None:
+                        queries.append(queries_number)
+                    sizes.append(len(content))
+                    statuses.append(status)
+        except Exception as error:
+            return {'error': f'{type(error).__name__}: {error}'}
+        return summarize(timings, queries, sizes, statuses)
+
+    def run(self, client, data):
+        results = {}
+        for scenario in get_read_scenarios(data):
+            if self.selected(scenario.name):
+                results[scenario.name] = self.measure(client, scenario)
+                if client.counts_queries and not self.options['no_cold']:
+                    results[scenario.name + COLD_SUFFIX] = self.measure(
+                        client, scenario, cold=True
+                    )
+        if self.options['no_writes']:
+            return results
+        names = count()
+        prefix = f'Benchmark {time.time_ns()}'
+        created = []
+        create = Scenario('recipe create', 'post', '/api/recipes/', auth=True)
+        if self.selected(create.name) or self.selected('recipe update'):
+            try:
+                with transaction.atomic():
+                    _, _, content, status = client.request(
+                        create, get_recipe_payload(data, f'{prefix} update')
+                    )
+            except Exception as error:
+                content = f'{type(error).__name__}: {error}'.encode()
+                status = None
+            if status == 201:
+                created.append(json.loads(content)['id'])
+            else:
+                results['recipe update'] = {
+                    'error': 'Рецепт не создан: '
+                             + content[:500].decode(errors='replace')
+                }
+        if self.selected(create.name):
+            results[create.name] = self.measure(
+                client, create,
+                lambda: get_recipe_payload(data, f'{prefix} {next(names)}')
+            )
+        update = Scenario(
+            'recipe update', 'patch', f'/api/recipes/{created[0]}/',
+            auth=True
+        ) if created else None
+        if update is not None and self.selected(update.name):
+            cooking_times = count(1)
+            results[update.name] = self.measure(
+                client, update,
+                lambda: {
+                    **get_recipe_payload(data, f'{prefix} update'),
+                    'cooking_time': next(cooking_times) % 100 + 1
+                }
+            )
+        if self.options['url']:
+            for recipe in Recipe.objects.filter(name__startswith=prefix):
+                recipe.delete()
+        return results
+
+    def report(self, results, counts_queries):
+        print(
+            f'{"Сценарий":<38} {"p50, мс":>9} {"p95, мс":>9} '
+            f'{"p99, мс":>9} {"запросов":>9} {"байт":>9} статус'
+        )
+        for name, result in results.items():
+            if 'error' in result:
+                print(f'{name:<38} ошибка: {result["error"]}')
+                continue
+            queries = result['queries'] if counts_queries else '-'
+            print(
+                f'{name:<38} {result["p50"]:>9.2f} {result["p95"]:>9.2f} '
+                f'{result["p99"]:>9.2f} {queries!s:>9} '
+                f'{result["bytes"]:>9} '
+                f'{",".join(map(str, result["status"]))}'
+            )
+        print()
+
+    def compare(self, results, baseline):
+        """Регрессии: рост p95 больше допуска, больше запросов к БД."""
+        tolerance = self.options['tolerance']
+        errors = []
+        print(
+            f'{"Сценарий":<38} {"p95 было":>9} {"p95 стало":>10} '
+            f'{"изм.":>7} {"запросов":>12}'
+        )
+        for name, result in results.items():
+            before = baseline.get(name)
+            if 'error' in result:
+                errors.append(f'{name}: {result["error"]}')
+                continue
+            if before is None or 'error' in before:
+                continue
+            change = (
+                (result[LATENCY_KEY] - before[LATENCY_KEY])
+                / before[LATENCY_KEY] * 100 if before[LATENCY_KEY] else 0
+            )
+            print(
+                f'{name:<38} {before[LATENCY_KEY]:>9.2f} '
+                f'{result[LATENCY_KEY]:>10.2f} {change:>+6.0f}% '
+                f'{before["queries"]!s:>5} -> {result["queries"]!s:<4}'
+            )
+            if change > tolerance:
+                errors.append(
+                    f'{name}: {LATENCY_KEY} вырос на {change:.0f}% '
+                    f'(допуск {tolerance:.0f}%)'
+                )
+            if (
+                None not in (result['queries'], before['queries'])
+                and result['queries'] > before['queries']
+            ):
+                errors.append(
+                    f'{name}: запросов к БД {before["queries"]} -> '
+                    f'{result["queries"]}'
+                )
+        print()
+        return errors
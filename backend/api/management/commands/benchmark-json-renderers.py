@@ -0,0 +1,114 @@
+import io
+import itertools
+import statistics
+import time
+from collections import OrderedDict
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api.renderers import FastJSONParser, FastJSONRenderer, orjson
+from api.serializers import (
+    IngredientSerializer,
+    RecipeToRepresentationSerializer
+)
+from recipes.models import Ingredient, Recipe
+from recipes.user_state import ANONYMOUS_STATE
+
+
+def get_payloads(page_size):
+    """
+    Данные ответов API из текущей БД: список всех ингредиентов,
+    страница рецептов (рецепты повторяются по кругу, если их меньше
+    page_size) и один рецепт.
+    """
+    context = {'user_state': ANONYMOUS_STATE}
+    recipes = list(Recipe.objects.with_related()[:page_size])
+    if not recipes:
+        raise CommandError('В БД нет рецептов')
+    page = RecipeToRepresentationSerializer(
+        list(itertools.islice(itertools.cycle(recipes), page_size)),
+        many=True,
+        context=context
+    ).data
+    return {
+        'ingredients': IngredientSerializer(
+            Ingredient.objects.all(), many=True
+        ).data,
+        f'recipes x{page_size}': OrderedDict((
+            ('count', page_size),
+            ('next', None),
+            ('previous', None),
+            ('results', page),
+        )),
+        'recipe': RecipeToRepresentationSerializer(
+            recipes[0], context=context
+        ).data,
+    }
+
+
+def measure(function, argument, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(argument)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+class Command(BaseCommand):
+    help = (
+        'This command compares DRF JSONRenderer/JSONParser with '
+        'FastJSONRenderer/FastJSONParser on API payloads from the database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--page-size', type=int, default=50,
+            help='Число рецептов на странице'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=50,
+            help='Число повторов на каждые данные (берется медиана)'
+        )
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError(
+                'orjson не установлен: FastJSONRenderer работает '
+                'как JSONRenderer'
+            )
+        repeat = options['repeat']
+        renderers = (JSONRenderer(), FastJSONRenderer())
+        parsers = (JSONParser(), FastJSONParser())
+        print(
+            f'{"Данные":>14} {"КБ":>7} {"render DRF, мс":>15} '
+            f'{"render orjson, мс":>18} {"parse DRF, мс":>14} '
+            f'{"parse orjson, мс":>17}'
+        )
+        for name, data in get_payloads(options['page_size']).items():
+            contents = [renderer.render(data) for renderer in renderers]
+            if contents[0] != contents[1]:
+                raise CommandError(f'JSON рендереров различается: {name}')
+            content = contents[0]
+            render_timings = [
+                measure(renderer.render, data, repeat)
+                for renderer in renderers
+            ]
+            parse_timings = [
+                measure(
+                    lambda content: parser.parse(io.BytesIO(content)),
+                    content,
+                    repeat
+                )
+                for parser in parsers
+            ]
+            print(
+                f'{name:>14} {len(content) / 1024:>7.1f} '
+                f'{render_timings[0] * 1000:>15.2f} '
+                f'{render_timings[1] * 1000:>18.2f} '
+                f'{parse_timings[0] * 1000:>14.2f} '
+                f'{parse_timings[1] * 1000:>17.2f}'
+            )
+        print('JSON рендереров совпадает побайтно')
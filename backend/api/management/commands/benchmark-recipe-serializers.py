@@ -0,0 +1,167 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from api.serializers import (
+    RecipeFastReadSerializer,
+    RecipeToRepresentationSerializer
+)
+from recipes.models import (
+    Ingredient, Recipe, RecipeIngredientAmount, Tag, User
+)
+from recipes.user_state import UserState
+
+SEED_IMAGE = 'recipes/images/benchmark.png'
+SEED_INGREDIENTS = 50
+INGREDIENTS_PER_RECIPE = (5, 15)
+
+
+class Rollback(Exception):
+    pass
+
+
+def seed(recipes_number):
+    """Рецепты с ингредиентами и тегами для замеров."""
+    random.seed(recipes_number)
+    author = User.objects.create(
+        username='benchmark',
+        email='benchmark@example.com',
+        first_name='Benchmark',
+        last_name='Author'
+    )
+    Ingredient.objects.bulk_create(
+        (
+            Ingredient(name=f'benchmark {num}', measurement_unit='г')
+            for num in range(SEED_INGREDIENTS)
+        ),
+        ignore_conflicts=True
+    )
+    ingredients_ids = list(Ingredient.objects.values_list('id', flat=True))
+    tags = [
+        Tag.objects.get_or_create(
+            slug=f'benchmark-{num}',
+            defaults={
+                'name': f'benchmark-{num}',
+                'color': f'#{num:06x}'
+            }
+        )[0]
+        for num in range(3)
+    ]
+    Recipe.objects.bulk_create(
+        Recipe(
+            name=f'Benchmark recipe {num}',
+            author=author,
+            text='Benchmark ' * 20,
+            image=SEED_IMAGE,
+            cooking_time=random.randint(1, 120)
+        )
+        for num in range(recipes_number)
+    )
+    recipes_ids = list(
+        Recipe.objects.filter(
+            image=SEED_IMAGE
+        ).order_by('id').values_list('id', flat=True)
+    )
+    RecipeIngredientAmount.objects.bulk_create(
+        RecipeIngredientAmount(
+            recipe_id=recipe_id,
+            ingredient_id=ingredient_id,
+            amount=random.randint(1, 500)
+        )
+        for recipe_id in recipes_ids
+        for ingredient_id in random.sample(
+            ingredients_ids, random.randint(*INGREDIENTS_PER_RECIPE)
+        )
+    )
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe_id=recipe_id, tag_id=tag.id)
+        for recipe_id in recipes_ids
+        for tag in random.sample(tags, random.randint(1, 3))
+    )
+    return recipes_ids
+
+
+def render_drf(recipes_ids, context):
+    recipes = Recipe.objects.filter(id__in=recipes_ids).with_related()
+    return JSONRenderer().render(
+        RecipeToRepresentationSerializer(
+            recipes, many=True, context=context
+        ).data
+    )
+
+
+def render_fast(recipes_ids, context):
+    recipes = Recipe.objects.filter(id__in=recipes_ids)
+    return JSONRenderer().render(
+        RecipeFastReadSerializer(recipes, many=True, context=context).data
+    )
+
+
+def measure(render, recipes_ids, context, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        content = render(recipes_ids, context)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), content
+
+
+class Command(BaseCommand):
+    help = (
+        'This command compares RecipeToRepresentationSerializer '
+        'with RecipeFastReadSerializer on synthetic pages of recipes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[6, 50, 200],
+            help='Размеры страниц'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Число повторов на каждый размер (берется медиана)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.benchmark(options['sizes'], options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def benchmark(self, sizes, repeat):
+        recipes_ids = seed(max(sizes))
+        context = {
+            'user_state': UserState(
+                favorites=frozenset(recipes_ids[::2]),
+                shopping_cart=frozenset(recipes_ids[::3]),
+            )
+        }
+        print(
+            f'{"Рецептов":>8} {"DRF, мс":>10} {"Быстрый, мс":>12} '
+            f'{"DRF, рец/с":>11} {"Быстрый, рец/с":>15} {"Ускорение":>10}'
+        )
+        for size in sizes:
+            page = recipes_ids[:size]
+            drf_time, drf_content = measure(
+                render_drf, page, context, repeat
+            )
+            fast_time, fast_content = measure(
+                render_fast, page, context, repeat
+            )
+            if drf_content != fast_content:
+                raise CommandError(
+                    f'JSON сериализаторов различается на {size} рецептах'
+                )
+            print(
+                f'{size:>8} {drf_time * 1000:>10.2f} '
+                f'{fast_time * 1000:>12.2f} '
+                f'{size / drf_time:>11.0f} {size / fast_time:>15.0f} '
+                f'{drf_time / fast_time:>9.1f}x'
+            )
+        print('JSON сериализаторов совпадает побайтно')
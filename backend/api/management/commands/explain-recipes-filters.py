@@ -0,0 +1,183 @@
+import itertools
+import json
+import random
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.views import RecipeViewSet
+from recipes.models import Favorite, Recipe, ShoppingCart, Tag, User
+
+FULL_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (?:TABLE )?(\w+)\b(?! USING)'),
+}
+SEED_TAGS = ('breakfast', 'lunch', 'dinner', 'snack')
+SEED_IMAGE = 'recipes/images/explain.png'
+BATCH_SIZE = 5000
+
+
+def seed(recipes_number, users_number, favorites_per_user):
+    """Синтетические пользователи, рецепты, теги, избранное и корзины."""
+    random.seed(recipes_number)
+    tags = [
+        Tag.objects.get_or_create(
+            slug=f'explain-{slug}',
+            defaults={
+                'name': f'explain-{slug}',
+                'color': f'#{random.randrange(16 ** 6):06x}'
+            }
+        )[0]
+        for slug in SEED_TAGS
+    ]
+    User.objects.bulk_create(
+        (
+            User(
+                username=f'explain{num}',
+                email=f'explain{num}@example.com',
+                first_name='Explain',
+                last_name=str(num)
+            )
+            for num in range(users_number)
+        ),
+        batch_size=BATCH_SIZE
+    )
+    users = list(User.objects.filter(username__startswith='explain'))
+    Recipe.objects.bulk_create(
+        (
+            Recipe(
+                name=f'Explain recipe {num}',
+                author=random.choice(users),
+                text='Explain',
+                image=SEED_IMAGE,
+                cooking_time=random.randint(1, 120)
+            )
+            for num in range(recipes_number)
+        ),
+        batch_size=BATCH_SIZE
+    )
+    recipes_ids = list(
+        Recipe.objects.filter(image=SEED_IMAGE).values_list('id', flat=True)
+    )
+    Recipe.tags.through.objects.bulk_create(
+        (
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag.id)
+            for recipe_id in recipes_ids
+            for tag in random.sample(tags, random.randint(1, 3))
+        ),
+        batch_size=BATCH_SIZE
+    )
+    for model in (Favorite, ShoppingCart):
+        model.objects.bulk_create(
+            (
+                model(user=user, recipe_id=recipe_id)
+                for user in users
+                for recipe_id in random.sample(
+                    recipes_ids, favorites_per_user
+                )
+            ),
+            batch_size=BATCH_SIZE
+        )
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+    return users, tags
+
+
+def get_filters_combinations(user, tags):
+    """
+    Пары (метка, параметры запроса) для всех сочетаний фильтров.
+    В метке вместо id пользователя — 'user', чтобы метки совпадали
+    между запусками.
+    """
+    values = {
+        'tags': (None, [tags[0].slug], [tag.slug for tag in tags[:2]]),
+        'author': (None, 'user'),
+        'is_favorited': (None, 1),
+        'is_in_shopping_cart': (None, 1),
+    }
+    for combination in itertools.product(*values.values()):
+        label = {
+            name: value
+            for name, value in zip(values, combination)
+            if value is not None
+        }
+        params = dict(label)
+        if 'author' in params:
+            params['author'] = user.id
+        yield json.dumps(label, sort_keys=True), params
+
+
+def get_page_queryset(params, user):
+    request = APIRequestFactory().get('/api/recipes/', params)
+    force_authenticate(
+        request, user=user, token=Token.objects.get_or_create(user=user)[0]
+    )
+    view = RecipeViewSet(
+        action='list', format_kwarg=None, args=(), kwargs={}
+    )
+    view.request = Request(request)
+    queryset = view.filter_queryset(view.get_queryset())
+    return queryset[:view.paginator.get_page_size(view.request)]
+
+
+class Command(BaseCommand):
+    help = (
+        'This command seeds a synthetic dataset in a rolled back '
+        'transaction and records EXPLAIN plans of the recipes list for '
+        'every RecipesFilter combination. Fails on full table scans '
+        'and, with --baseline, on any plan change.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=20000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--favorites-per-user', type=int, default=20)
+        parser.add_argument(
+            '--output', help='JSON-файл для записи планов'
+        )
+        parser.add_argument(
+            '--baseline', help='JSON-файл с планами для сравнения'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            users, tags = seed(
+                recipes_number=options['recipes'],
+                users_number=options['users'],
+                favorites_per_user=options['favorites_per_user']
+            )
+            plans = {
+                label: get_page_queryset(params, users[0]).explain()
+                for label, params in get_filters_combinations(
+                    users[0], tags
+                )
+            }
+            transaction.set_rollback(True)
+        pattern = FULL_SCAN_PATTERNS.get(connection.vendor)
+        errors = []
+        for params, plan in plans.items():
+            print(params)
+            print(plan)
+            print()
+            scanned = pattern.findall(plan) if pattern else []
+            if scanned:
+                errors.append(f'{params}: полный просмотр {scanned}')
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf8') as file:
+                json.dump(plans, file, ensure_ascii=False, indent=2)
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf8') as file:
+                baseline = json.load(file)
+            errors.extend(
+                f'{params}: план изменился'
+                for params, plan in plans.items()
+                if baseline.get(params) != plan
+            )
+        if errors:
+            raise CommandError('\n'.join(errors))
+        print(f'Планов без полного просмотра таблиц: {len(plans)}')
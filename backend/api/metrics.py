@@ -0,0 +1,128 @@
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+
+SQL_STRING = re.compile(r"'(?:[^']|'')*'")
+SQL_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+SQL_LIST = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)')
+SQL_SPACES = re.compile(r'\s+')
+TIMINGS = ('db', 'serialize', 'render')
+
+_request_metrics = ContextVar('request_metrics', default=None)
+
+
+def get_query_fingerprint(sql):
+    """
+    SQL без значений: литералы и списки параметров IN (...) заменены,
+    так что запросы, различающиеся только значениями (N+1), совпадают.
+    """
+    sql = SQL_STRING.sub('?', sql)
+    sql = SQL_NUMBER.sub('?', sql)
+    sql = SQL_LIST.sub('(...)', sql)
+    return SQL_SPACES.sub(' ', sql).strip()
+
+
+@dataclass
+class RequestMetrics:
+    """
+    Метрики запроса: число и время запросов к БД, время сериализации
+    (вместе с запросами внутри нее) и рендеринга, в секундах.
+    fingerprints (только для запросов из выборки) — сколько раз
+    выполнялся каждый отпечаток SQL.
+    """
+    queries: int = 0
+    db: float = 0.0
+    serialize: float = 0.0
+    render: float = 0.0
+    fingerprints: Counter = None
+    depth: Counter = field(default_factory=Counter)
+
+    def execute(self, execute, sql, params, many, context):
+        """Обертка connection.execute_wrapper."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - start
+            self.queries += 1
+            if self.fingerprints is not None:
+                self.fingerprints[get_query_fingerprint(sql)] += 1
+
+    def get_duplicates(self, minimum, limit):
+        """До limit отпечатков SQL, выполненных не меньше minimum раз."""
+        if self.fingerprints is None:
+            return []
+        return [
+            {'count': number, 'sql': fingerprint}
+            for fingerprint, number in self.fingerprints.most_common(limit)
+            if number >= minimum
+        ]
+
+    def get_server_timing(self, total):
+        metrics = [
+            f'{name};dur={getattr(self, name) * 1000:.1f}'
+            for name in TIMINGS
+        ]
+        metrics[0] += f';desc="{self.queries} queries"'
+        metrics.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(metrics)
+
+
+def get_request_metrics():
+    return _request_metrics.get()
+
+
+def set_request_metrics(metrics):
+    return _request_metrics.set(metrics)
+
+
+def reset_request_metrics(token):
+    _request_metrics.reset(token)
+
+
+def timed(function, metric):
+    """
+    function, время которой прибавляется к метрике metric текущего
+    запроса. Вложенные вызовы (сериализатор внутри сериализатора)
+    не считаются повторно.
+    """
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        metrics = _request_metrics.get()
+        if metrics is None or metrics.depth[metric]:
+            return function(*args, **kwargs)
+        metrics.depth[metric] += 1
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            setattr(
+                metrics, metric,
+                getattr(metrics, metric) + time.perf_counter() - start
+            )
+            metrics.depth[metric] -= 1
+
+    wrapper.timed = True
+    return wrapper
+
+
+def instrument(cls, name, metric):
+    """Замеряет метод или свойство name класса cls в метрику metric."""
+    attribute = cls.__dict__[name]
+    if isinstance(attribute, property):
+        if not getattr(attribute.fget, 'timed', False):
+            setattr(cls, name, property(timed(attribute.fget, metric)))
+    elif not getattr(attribute, 'timed', False):
+        setattr(cls, name, timed(attribute, metric))
+
+
+def instrument_classes(classes, name, metric):
+    """Все определения name в классах classes и их предках."""
+    for cls in {
+        klass for cls in classes for klass in cls.__mro__
+        if name in klass.__dict__
+    }:
+        instrument(cls, name, metric)
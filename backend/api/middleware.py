@@ -0,0 +1,77 @@
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .metrics import (
+    RequestMetrics, reset_request_metrics, set_request_metrics
+)
+
+logger = logging.getLogger('foodgram.requests')
+
+
+class RequestMetricsMiddleware:
+    """
+    При REQUEST_METRICS_ENABLED считает для каждого запроса запросы
+    к БД и их время, время сериализации и рендеринга, отдает их
+    в заголовке Server-Timing и пишет строкой JSON в лог
+    foodgram.requests. Доля REQUEST_METRICS_SAMPLE_RATE запросов
+    дополнительно собирает отпечатки SQL: повторяющиеся (N+1)
+    попадают в лог. Содержимое потоковых ответов (скачивание списка
+    покупок) формируется уже после middleware и не учитывается.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sampled = random.random() < settings.REQUEST_METRICS_SAMPLE_RATE
+        metrics = RequestMetrics(fingerprints=Counter() if sampled else None)
+        token = set_request_metrics(metrics)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(metrics.execute)
+                    )
+                response = self.get_response(request)
+        finally:
+            reset_request_metrics(token)
+        total = time.perf_counter() - start
+        response['Server-Timing'] = metrics.get_server_timing(total)
+        logger.info(json.dumps(
+            self.get_log_record(request, response, metrics, total),
+            ensure_ascii=False
+        ))
+        return response
+
+    @staticmethod
+    def get_log_record(request, response, metrics, total):
+        resolver_match = request.resolver_match
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': resolver_match.view_name if resolver_match else None,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'queries': metrics.queries,
+            'db_ms': round(metrics.db * 1000, 1),
+            'serialize_ms': round(metrics.serialize * 1000, 1),
+            'render_ms': round(metrics.render * 1000, 1),
+            'sampled': metrics.fingerprints is not None,
+        }
+        if metrics.fingerprints is not None:
+            record['duplicates'] = metrics.get_duplicates(
+                minimum=settings.REQUEST_METRICS_DUPLICATES_MIN,
+                limit=settings.REQUEST_METRICS_DUPLICATES_LIMIT
+            )
+        return record
@@ -0,0 +1,379 @@
+import gzip
+import hashlib
+import re
+from dataclasses import dataclass
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import prefetch_related_objects
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.exceptions import NotFound
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+
+from .renderers import get_json_renderer
+from recipes.catalogues import get_catalogue_version
+from recipes.models import get_recipe_related_lookups
+from recipes.user_state import ANONYMOUS_STATE, get_user_state
+from recipes.versions import (
+    get_counts_version, get_recipes_versions, get_recipes_versions_many
+)
+
+RESPONSE_CACHE_KEY = 'response:{signature}'
+RESPONSE_CACHE_HEADER = 'X-Response-Cache'
+RECIPE_FRAGMENT_KEY = 'recipe-fragment:{signature}'
+RECIPE_FLAG = b'"{name}":false'
+RESULTS_PLACEHOLDER = b'"results":[]}'
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+_catalogues = {}
+
+
+@dataclass(frozen=True)
+class CatalogueEntry:
+    version: int
+    etag: str
+    content: bytes
+
+
+class CatalogueCacheMixin:
+    """
+    Отдает список справочника готовыми байтами JSON из кэша процесса.
+    Кэш сбрасывается сменой версии справочника (сигналы моделей),
+    клиенту отдается ETag и 304 Not Modified по If-None-Match.
+    """
+    catalogue_renderer = get_json_renderer()
+
+    def use_catalogue_cache(self, request):
+        return request.accepted_renderer.format == 'json'
+
+    def get_catalogue(self):
+        model = self.get_queryset().model
+        version = get_catalogue_version(model)
+        entry = _catalogues.get(model)
+        if entry is None or entry.version != version:
+            content = self.catalogue_renderer.render(
+                self.get_serializer(self.get_queryset(), many=True).data
+            )
+            entry = CatalogueEntry(
+                version=version,
+                etag=quote_etag(
+                    hashlib.blake2b(content, digest_size=16).hexdigest()
+                ),
+                content=content
+            )
+            _catalogues[model] = entry
+        return entry
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_catalogue_cache(request):
+            return super().list(request, *args, **kwargs)
+        catalogue = self.get_catalogue()
+        etags = parse_etags(request.headers.get('If-None-Match', ''))
+        if catalogue.etag in etags or '*' in etags:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(
+                catalogue.content,
+                content_type=self.catalogue_renderer.media_type
+            )
+        response['ETag'] = catalogue.etag
+        return response
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    headers: tuple
+    content: bytes
+
+
+def get_normalized_query(request):
+    """Параметры запроса в каноническом порядке (и их значения тоже)."""
+    return urlencode(sorted(
+        (name, value)
+        for name, values in request.query_params.lists()
+        for value in values
+    ))
+
+
+class AnonymousResponseCacheMixin:
+    """
+    Кэширует сжатые gzip ответы list/retrieve для анонимных запросов:
+    для них флаги пользователя всегда False, и ответ зависит только
+    от адреса и параметров запроса. Ключ включает версии рецептов,
+    которые меняют сигналы моделей (recipes.versions). Бэкенд —
+    кэш Django RESPONSE_CACHE_ALIAS.
+    """
+    response_cache_actions = ('list', 'retrieve')
+    response_cache_renderer = get_json_renderer()
+
+    def use_response_cache(self, request):
+        return (
+            settings.RESPONSE_CACHE_TIMEOUT > 0
+            and request.auth is None
+            and self.action in self.response_cache_actions
+            and request.accepted_media_type
+            == self.response_cache_renderer.media_type
+        )
+
+    def get_response_cache_key(self, request):
+        """
+        Ключ ответа: адрес, параметры и версии рецептов; для списка —
+        еще версия счетчиков пагинации. id рецепта приводится к int,
+        чтобы /api/recipes/01/ зависел от версии рецепта 1.
+        """
+        recipe_id = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        if recipe_id is None:
+            versions = (*get_recipes_versions(), get_counts_version())
+        else:
+            try:
+                recipe_id = int(recipe_id)
+            except ValueError:
+                raise NotFound
+            versions = get_recipes_versions(recipe_id)
+        signature = '|'.join((
+            request.build_absolute_uri(request.path),
+            get_normalized_query(request),
+            str(versions),
+        ))
+        return RESPONSE_CACHE_KEY.format(
+            signature=hashlib.blake2b(
+                signature.encode(), digest_size=16
+            ).hexdigest()
+        )
+
+    def get_cached_response(self, request, response_cache, key):
+        cached = response_cache.get(key)
+        if cached is None:
+            return None
+        if ACCEPTS_GZIP.search(request.headers.get('Accept-Encoding', '')):
+            response = HttpResponse(
+                cached.content,
+                content_type=self.response_cache_renderer.media_type
+            )
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(
+                gzip.decompress(cached.content),
+                content_type=self.response_cache_renderer.media_type
+            )
+        for name, value in cached.headers:
+            response[name] = value
+        return response
+
+    def cache_response(self, response_cache, key, response):
+        headers = tuple(
+            (name, value) for name, value in response.items()
+            if name.lower() != 'content-type'
+        )
+        if isinstance(response, Response):
+            content = self.response_cache_renderer.render(response.data)
+        else:
+            content = response.content
+        response_cache.set(
+            key,
+            CachedResponse(
+                headers=headers,
+                content=gzip.compress(content, mtime=0)
+            ),
+            settings.RESPONSE_CACHE_TIMEOUT
+        )
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if getattr(self, 'response_cache_used', False):
+            patch_vary_headers(response, ('Authorization', 'Accept-Encoding'))
+        return response
+
+    def cached(self, handler, request, *args, **kwargs):
+        if not self.use_response_cache(request):
+            return handler(request, *args, **kwargs)
+        self.response_cache_used = True
+        response_cache = caches[settings.RESPONSE_CACHE_ALIAS]
+        key = self.get_response_cache_key(request)
+        response = self.get_cached_response(request, response_cache, key)
+        if response is not None:
+            response[RESPONSE_CACHE_HEADER] = 'hit'
+            return response
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            self.cache_response(response_cache, key, response)
+        response[RESPONSE_CACHE_HEADER] = 'miss'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached(super().retrieve, request, *args, **kwargs)
+
+
+@dataclass(frozen=True)
+class RecipeFragment:
+    """
+    JSON рецепта, разрезанный по флагам пользователя: segments[i + 1]
+    идет после флага flags[i] = (поле UserState, проверяемый id).
+    """
+    segments: tuple
+    flags: tuple
+
+    def render(self, user_state):
+        parts = [self.segments[0]]
+        for (state_field, id_), segment in zip(self.flags, self.segments[1:]):
+            parts.append(
+                b'true' if id_ in getattr(user_state, state_field)
+                else b'false'
+            )
+            parts.append(segment)
+        return b''.join(parts)
+
+
+def make_recipe_fragment(content, flags):
+    """
+    Режет JSON рецепта content, отрисованный с флагами False, по
+    флагам flags = ((ключ JSON, поле UserState, id), ...). Ключ
+    с кавычками не может встретиться внутри строки JSON: кавычки
+    в строках экранируются.
+    """
+    positions = sorted(
+        (content.index(RECIPE_FLAG.replace(b'{name}', name.encode())),
+         name, state_field, id_)
+        for name, state_field, id_ in flags
+    )
+    segments = []
+    start = 0
+    for position, name, _, _ in positions:
+        end = position + len(name) + 3
+        segments.append(content[start:end])
+        start = end + len(b'false')
+    segments.append(content[start:])
+    return RecipeFragment(
+        segments=tuple(segments),
+        flags=tuple(
+            (state_field, id_) for _, _, state_field, id_ in positions
+        )
+    )
+
+
+class RecipeFragmentCacheMixin:
+    """
+    Собирает ответы list/retrieve рецептов из JSON отдельных рецептов,
+    общих для всех пользователей и закэшированных на
+    RECIPE_FRAGMENT_CACHE_TIMEOUT секунд (0 — без кэша). Флаги
+    избранного, корзины и подписки на автора подставляются при ответе
+    из множеств ID пользователя (recipes.user_state), поэтому
+    сериализуются (fragment_serializer_class) только рецепты,
+    которых еще нет в кэше.
+    """
+    fragment_cache_actions = ('list', 'retrieve')
+    fragment_renderer = get_json_renderer()
+    fragment_serializer_class = None
+
+    def use_fragment_cache(self, request):
+        return (
+            self.action in self.fragment_cache_actions
+            and request.accepted_media_type
+            == self.fragment_renderer.media_type
+        )
+
+    @staticmethod
+    def get_fragment_flags(recipe):
+        return (
+            ('is_subscribed', 'subscriptions', recipe.author_id),
+            ('is_favorited', 'favorites', recipe.id),
+            ('is_in_shopping_cart', 'shopping_cart', recipe.id),
+        )
+
+    def get_fragments(self, recipes):
+        """JSON рецептов recipes: из кэша, недостающие — сериализуются."""
+        fragment_cache = caches[settings.RESPONSE_CACHE_ALIAS]
+        base_url = self.request.build_absolute_uri('/')
+        keys = {
+            recipe_id: RECIPE_FRAGMENT_KEY.format(
+                signature=hashlib.blake2b(
+                    f'{base_url}|{recipe_id}|{versions}'.encode(),
+                    digest_size=16
+                ).hexdigest()
+            )
+            for recipe_id, versions in get_recipes_versions_many(
+                [recipe.id for recipe in recipes]
+            ).items()
+        }
+        timeout = settings.RECIPE_FRAGMENT_CACHE_TIMEOUT
+        fragments = fragment_cache.get_many(keys.values()) if timeout else {}
+        missing = [
+            recipe for recipe in recipes if keys[recipe.id] not in fragments
+        ]
+        if missing:
+            serializer_class = self.fragment_serializer_class
+            if serializer_class is None:
+                serializer_class = self.get_serializer_class()
+                prefetch_related_objects(
+                    missing, *get_recipe_related_lookups()
+                )
+            serializer = serializer_class(
+                missing,
+                many=True,
+                context={
+                    **self.get_serializer_context(),
+                    'user_state': ANONYMOUS_STATE
+                }
+            )
+            new_fragments = {
+                keys[recipe.id]: make_recipe_fragment(
+                    self.fragment_renderer.render(data),
+                    self.get_fragment_flags(recipe)
+                )
+                for recipe, data in zip(missing, serializer.data)
+            }
+            if timeout:
+                fragment_cache.set_many(new_fragments, timeout)
+            fragments.update(new_fragments)
+        return [fragments[keys[recipe.id]] for recipe in recipes]
+
+    def get_fragment_queryset(self):
+        return self.filter_queryset(
+            self.get_queryset()
+        ).prefetch_related(None)
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_fragment_cache(request):
+            return super().list(request, *args, **kwargs)
+        recipes = self.paginate_queryset(self.get_fragment_queryset())
+        user_state = get_user_state(request)
+        results = b','.join(
+            fragment.render(user_state)
+            for fragment in self.get_fragments(recipes)
+        )
+        envelope = self.get_paginated_response([])
+        content = self.fragment_renderer.render(envelope.data)
+        response = HttpResponse(
+            content[:-len(RESULTS_PLACEHOLDER)]
+            + b'"results":[' + results + b']}',
+            content_type=self.fragment_renderer.media_type
+        )
+        for name, value in envelope.items():
+            if name.lower() != 'content-type':
+                response[name] = value
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.use_fragment_cache(request):
+            return super().retrieve(request, *args, **kwargs)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        recipe = get_object_or_404(
+            self.get_fragment_queryset(),
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        self.check_object_permissions(request, recipe)
+        fragment, = self.get_fragments([recipe])
+        return HttpResponse(
+            fragment.render(get_user_state(request)),
+            content_type=self.fragment_renderer.media_type
+        )
@@ -1,7 +1,268 @@
+import hashlib
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from recipes.versions import get_counts_version
+
+INVALID_CURSOR = 'Неверный курсор'
+COUNT_CACHE_KEY = 'pagination-count:{version}:{signature}'
+COUNT_ESTIMATED_HEADER = 'X-Count-Estimated'
+
+
+def get_estimated_count(queryset):
+    """
+    Оценка числа строк таблицы по статистике PostgreSQL (reltuples).
+    None, если оценка недоступна: другая СУБД, запрос с условиями
+    или таблица еще не анализировалась.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql' or queryset.query.where:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+            (queryset.model._meta.db_table,)
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+def get_count(queryset):
+    """
+    Число объектов queryset и признак того, что оно оценочное.
+    Результат кэшируется по тексту SQL-запроса на
+    PAGINATION_COUNT_CACHE_TIMEOUT секунд, до смены версии счетчиков
+    (recipes.versions.get_counts_version); для больших таблиц без
+    фильтров вместо COUNT(*) берется оценка из статистики PostgreSQL.
+    """
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return 0, False
+    key = COUNT_CACHE_KEY.format(
+        version=get_counts_version(),
+        signature=hashlib.blake2b(
+            f'{queryset.db}:{sql}:{params}'.encode(), digest_size=16
+        ).hexdigest()
+    )
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    count, estimated = get_estimated_count(queryset), True
+    if count is None or count < settings.PAGINATION_COUNT_ESTIMATE_FROM:
+        count, estimated = queryset.count(), False
+    cache.set(
+        key, (count, estimated), settings.PAGINATION_COUNT_CACHE_TIMEOUT
+    )
+    return count, estimated
+
+
+class CachedCountPage(Page):
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self.next_exists = has_next
+
+    def has_next(self):
+        return self.next_exists
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Число объектов — из кэша или оценочное, поэтому оно может
+    отставать от таблицы. Страница им не обрезается: выбирается
+    per_page + 1 объект, и лишний показывает, есть ли следующая
+    страница. Если по странице видно, что объектов больше (или она
+    последняя), count исправляется.
+    """
+
+    def validate_number(self, number):
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            return super().validate_number(number)
+        if number < 1:
+            raise EmptyPage(_('That page number is less than 1'))
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        objects = list(self.object_list[bottom:bottom + self.per_page + 1])
+        has_next = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        if not objects and number > 1:
+            raise EmptyPage(_('That page contains no results'))
+        seen = bottom + len(objects)
+        if not has_next:
+            self.count_and_estimated = (seen, False)
+        elif self.count <= seen:
+            self.count_and_estimated = (seen + 1, self.count_estimated)
+        self.__dict__.pop('count', None)
+        self.__dict__.pop('num_pages', None)
+        return CachedCountPage(objects, number, self, has_next)
+
+    @cached_property
+    def count_and_estimated(self):
+        return get_count(self.object_list)
+
+    @cached_property
+    def count(self):
+        return self.count_and_estimated[0]
+
+    @property
+    def count_estimated(self):
+        return self.count_and_estimated[1]
 
 
 class LimitPageQueryParamsPaginator(PageNumberPagination):
+    """
+    Постраничная пагинация (?page=N&limit=M) и, если в запросе есть
+    параметр cursor (пустой — первая страница), keyset-пагинация по
+    cursor_ordering представления: цена страницы не зависит от ее
+    глубины, а COUNT(*) выполняется только по запросу (?count=true).
+    """
+    django_paginator_class = CachedCountPaginator
     page_size = 6
     page_size_query_param = 'limit'
     page_query_param = 'page'
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    cursor_ordering = ('-id',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = getattr(view, 'cursor_ordering', self.cursor_ordering)
+        self.count = None
+        if request.query_params.get(self.count_query_param) == 'true':
+            self.count, self.count_estimated = get_count(queryset)
+        position, reverse = self.decode_cursor(request)
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(
+                field[1:] if field.startswith('-') else f'-{field}'
+                for field in ordering
+            )
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            try:
+                queryset = queryset.filter(
+                    self.get_keyset_filter(ordering, position)
+                )
+            except (DjangoValidationError, TypeError, ValueError):
+                raise NotFound(INVALID_CURSOR)
+        page_size = self.get_page_size(request)
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+        self.page_results = results
+        return results
+
+    @staticmethod
+    def get_keyset_filter(ordering, position):
+        """
+        Строки строго после position в порядке ordering:
+        (a > x) OR (a = x AND b > y) OR ...
+        """
+        keyset_filter = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            keyset_filter |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return keyset_filter
+
+    def get_position(self, instance):
+        return [
+            getattr(instance, field.lstrip('-'))
+            for field in self.ordering
+        ]
+
+    def encode_cursor(self, instance, reverse):
+        cursor = urlsafe_b64encode(
+            json.dumps(
+                [self.get_position(instance), reverse],
+                default=str
+            ).encode()
+        ).decode()
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, cursor
+        )
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            position, reverse = json.loads(urlsafe_b64decode(cursor))
+        except (BinasciiError, TypeError, ValueError):
+            raise NotFound(INVALID_CURSOR)
+        if (
+            not isinstance(position, list)
+            or len(position) != len(self.ordering)
+        ):
+            raise NotFound(INVALID_CURSOR)
+        return position, bool(reverse)
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next or not self.page_results:
+            return None
+        return self.encode_cursor(self.page_results[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.cursor_mode:
+            return super().get_previous_link()
+        if not self.has_previous or not self.page_results:
+            return None
+        return self.encode_cursor(self.page_results[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            response = super().get_paginated_response(data)
+            count_estimated = self.page.paginator.count_estimated
+        else:
+            response = OrderedDict()
+            if self.count is not None:
+                response['count'] = self.count
+            response['next'] = self.get_next_link()
+            response['previous'] = self.get_previous_link()
+            response['results'] = data
+            response = Response(response)
+            if self.count is None:
+                return response
+            count_estimated = self.count_estimated
+        response[COUNT_ESTIMATED_HEADER] = str(count_estimated).lower()
+        return response
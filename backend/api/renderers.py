@@ -0,0 +1,87 @@
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+LINE_SEPARATOR = '\u2028'.encode()
+PARAGRAPH_SEPARATOR = '\u2029'.encode()
+
+_encoder = JSONEncoder()
+
+
+def encode_default(obj):
+    """
+    Типы, которых нет в orjson (Decimal, ленивые строки, QuerySet),
+    и даты с временем кодируются как в JSONEncoder DRF: '...Z' вместо
+    '+00:00' и миллисекунды вместо микросекунд.
+    """
+    return _encoder.default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson. Без orjson, с отступами, с отключенными
+    UNICODE_JSON или COMPACT_JSON и для данных, которые orjson
+    не кодирует (например, ключей-не строк), рендерит JSONRenderer DRF.
+    Результат совпадает с JSONRenderer побайтно, кроме чисел
+    с плавающей точкой, которые orjson может записать короче.
+    """
+    options = (
+        orjson.OPT_PASSTHROUGH_DATETIME if orjson is not None else None
+    )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        try:
+            content = orjson.dumps(
+                data, default=encode_default, option=self.options
+            )
+        except orjson.JSONEncodeError:
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        if LINE_SEPARATOR in content or PARAGRAPH_SEPARATOR in content:
+            content = content.replace(
+                LINE_SEPARATOR, b'\\u2028'
+            ).replace(PARAGRAPH_SEPARATOR, b'\\u2029')
+        return content
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser на orjson, без orjson — JSONParser DRF."""
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as error:
+            raise ParseError(f'JSON parse error - {error}')
+
+
+def get_json_renderer():
+    """
+    Рендерер JSON из REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES']
+    (JSONRenderer DRF, если его там нет) для ответов, которые
+    собираются из готовых байтов JSON.
+    """
+    for renderer_class in api_settings.DEFAULT_RENDERER_CLASSES:
+        if renderer_class.format == 'json':
+            return renderer_class()
+    return JSONRenderer()
@@ -1,10 +1,17 @@
+from collections import Counter
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserSerializer
-from drf_extra_fields.fields import Base64ImageField
+from recipes import images, utils
 from recipes.models import Ingredient, Recipe, RecipeIngredientAmount, Tag
+from recipes.user_state import get_user_state
 from rest_framework import serializers
 
+from .fields import StreamingBase64ImageField
+
 SAME_ID = (
     'Нельзя передавать одинаковые ID: '
     'id={id}'
@@ -17,6 +24,16 @@ ID_NOT_EXISTS = (
 User = get_user_model()
 
 
+def get_context_user_state(context):
+    """
+    Состояние пользователя для флагов: из контекста сериализатора
+    (user_state), иначе — пользователя запроса.
+    """
+    if 'user_state' in context:
+        return context['user_state']
+    return get_user_state(context['request'])
+
+
 class BaseUsersSerializer(UserSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
@@ -32,13 +49,9 @@ class BaseUsersSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, author):
-        request = self.context['request']
-        user = request.user
-        if request.auth is not None:
-            return user.subscribers.all().filter(
-                author=author
-            ).exists()
-        return False
+        return author.id in get_context_user_state(
+            self.context
+        ).subscriptions
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -89,6 +102,25 @@ class IngredientAmountCreateSerializer(serializers.Serializer):
     amount = serializers.IntegerField()
 
 
+class RecipesIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_MAX_LENGTH
+    )
+
+
+def get_image_renditions(recipe, request=None):
+    """URL рендиций изображения, абсолютные при наличии запроса."""
+    urls = images.get_rendition_urls(recipe)
+    if request is None:
+        return urls
+    return {
+        name: url and request.build_absolute_uri(url)
+        for name, url in urls.items()
+    }
+
+
 class RecipeToRepresentationSerializer(serializers.ModelSerializer):
     ingredients = IngredientAmountReadSerializer(
         many=True,
@@ -98,30 +130,132 @@ class RecipeToRepresentationSerializer(serializers.ModelSerializer):
     author = BaseUsersSerializer()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         exclude = ('pub_date',)
 
+    def get_image_renditions(self, recipe):
+        return get_image_renditions(recipe, self.context.get('request'))
+
     def get_is_favorited(self, recipe):
-        request = self.context['request']
-        if request.auth is not None:
-            return request.user.favorites.filter(
-                recipe=recipe
-            ).exists()
-        return False
+        return recipe.id in get_context_user_state(
+            self.context
+        ).favorites
 
     def get_is_in_shopping_cart(self, recipe):
-        request = self.context['request']
-        if request.auth is not None:
-            return request.user.shoppingcarts.filter(
-                recipe=recipe
-            ).exists()
-        return False
+        return recipe.id in get_context_user_state(
+            self.context
+        ).shopping_cart
+
+
+class RecipeFastReadSerializer:
+    """
+    Только для чтения: те же данные, что RecipeToRepresentationSerializer,
+    но без полей DRF. Связанные объекты читаются через values_list
+    тремя запросами на все рецепты сразу, словари собираются напрямую.
+    Порядок ключей повторяет RecipeToRepresentationSerializer, чтобы
+    JSON совпадал побайтно.
+    """
+    author_fields = tuple(
+        field for field in BaseUsersSerializer.Meta.fields
+        if field != 'is_subscribed'
+    )
+
+    def __init__(self, instance, many=False, context=None):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+
+    @property
+    def data(self):
+        recipes = list(self.instance) if self.many else [self.instance]
+        data = self.to_representation(recipes)
+        return data if self.many else data[0]
+
+    @staticmethod
+    def get_ingredients(recipes_ids):
+        ingredients = {recipe_id: [] for recipe_id in recipes_ids}
+        for recipe_id, id_, name, amount, measurement_unit in (
+            RecipeIngredientAmount.objects.filter(
+                recipe__in=recipes_ids
+            ).values_list(
+                'recipe', 'ingredient', 'ingredient__name',
+                'amount', 'ingredient__measurement_unit'
+            )
+        ):
+            ingredients[recipe_id].append({
+                'id': id_,
+                'name': name,
+                'amount': amount,
+                'measurement_unit': measurement_unit
+            })
+        return ingredients
+
+    @staticmethod
+    def get_tags(recipes_ids):
+        tags = {recipe_id: [] for recipe_id in recipes_ids}
+        for recipe_id, id_, name, color, slug in (
+            Recipe.tags.through.objects.filter(
+                recipe__in=recipes_ids
+            ).order_by('tag__name').values_list(
+                'recipe', 'tag', 'tag__name', 'tag__color', 'tag__slug'
+            )
+        ):
+            tags[recipe_id].append({
+                'id': id_,
+                'name': name,
+                'color': color,
+                'slug': slug
+            })
+        return tags
+
+    def get_authors(self, authors_ids):
+        return {
+            author['id']: author
+            for author in User.objects.filter(
+                id__in=authors_ids
+            ).values(*self.author_fields)
+        }
+
+    def to_representation(self, recipes):
+        request = self.context.get('request')
+        user_state = get_context_user_state(self.context)
+        recipes_ids = [recipe.id for recipe in recipes]
+        ingredients = self.get_ingredients(recipes_ids)
+        tags = self.get_tags(recipes_ids)
+        authors = self.get_authors({recipe.author_id for recipe in recipes})
+        data = []
+        for recipe in recipes:
+            image = None
+            if recipe.image:
+                image = recipe.image.url
+                if request is not None:
+                    image = request.build_absolute_uri(image)
+            data.append({
+                'id': recipe.id,
+                'ingredients': ingredients[recipe.id],
+                'tags': tags[recipe.id],
+                'author': {
+                    **authors[recipe.author_id],
+                    'is_subscribed': (
+                        recipe.author_id in user_state.subscriptions
+                    )
+                },
+                'is_favorited': recipe.id in user_state.favorites,
+                'is_in_shopping_cart': recipe.id in user_state.shopping_cart,
+                'image_renditions': get_image_renditions(recipe, request),
+                'name': recipe.name,
+                'text': recipe.text,
+                'image': image,
+                'cooking_time': recipe.cooking_time
+            })
+        return data
 
 
 class RecipeSerializer(serializers.ModelSerializer):
-    image = Base64ImageField(required=True)
+    image = StreamingBase64ImageField(required=True)
     ingredients = IngredientAmountCreateSerializer(many=True, required=True)
     tags = serializers.PrimaryKeyRelatedField(
         many=True, required=True, queryset=Tag.objects.all()
@@ -140,37 +274,34 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ('author',)
 
-    def unique_exists_validator(self, model, ids):
-        not_exists_ids = list(
-            set(ids) - set(
-                model.objects.filter(
-                    id__in=set(ids)
-                ).values_list('id', flat=True)
+    def unique_exists_validator(self, ids, model=None):
+        if model is not None:
+            not_exists_ids = list(
+                set(ids) - set(
+                    model.objects.filter(
+                        id__in=set(ids)
+                    ).values_list('id', flat=True)
+                )
             )
-        )
-        if not_exists_ids:
-            raise serializers.ValidationError(
-                ID_NOT_EXISTS.format(id=not_exists_ids)
-            )
-
-        not_unique_ids = list(
-            set(
-                [
-                    id_
-                    for id_ in set(ids)
-                    if ids.count(id_) > 1
-                ]
-            )
-        )
+            if not_exists_ids:
+                raise serializers.ValidationError(
+                    ID_NOT_EXISTS.format(id=not_exists_ids)
+                )
+
+        not_unique_ids = [
+            id_
+            for id_, count in Counter(ids).items()
+            if count > 1
+        ]
         if not_unique_ids:
             raise serializers.ValidationError(
                 SAME_ID.format(id=not_unique_ids)
             )
 
     def validate_tags(self, tags):
+        # Существование тегов уже проверено PrimaryKeyRelatedField.
         self.unique_exists_validator(
-            model=Tag,
-            ids=self.initial_data['tags']
+            ids=[tag.id for tag in tags]
         )
         return tags
 
@@ -184,47 +315,99 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
         return ingredients
 
-    def recipe_ingredient_amount_bulk_create(
-            self, recipe, ingredients_amount
-    ):
+    def set_recipe_ingredients(self, recipe, ingredients_amount, old_rows=()):
+        """
+        Приводит строки ингредиентов рецепта к ingredients_amount:
+        удаляются, изменяются и создаются только отличающиеся строки.
+        ID ингредиентов уже проверены в validate_ingredients.
+        Возвращает прежние и новые количества (ingredient_id -> amount).
+        """
+        new_amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients_amount
+        }
+        old_amounts = Counter()
+        kept_rows = {}
+        deleted_ids = []
+        changed_rows = []
+        for row in old_rows:
+            old_amounts[row.ingredient_id] += row.amount
+            if (
+                row.ingredient_id not in new_amounts
+                or row.ingredient_id in kept_rows
+            ):
+                deleted_ids.append(row.id)
+                continue
+            kept_rows[row.ingredient_id] = row
+            if row.amount != new_amounts[row.ingredient_id]:
+                row.amount = new_amounts[row.ingredient_id]
+                changed_rows.append(row)
+        if deleted_ids:
+            RecipeIngredientAmount.objects.filter(id__in=deleted_ids).delete()
+        if changed_rows:
+            RecipeIngredientAmount.objects.bulk_update(
+                changed_rows, ('amount',)
+            )
         RecipeIngredientAmount.objects.bulk_create(
             RecipeIngredientAmount(
                 recipe=recipe,
-                ingredient=get_object_or_404(
-                    Ingredient, id=ingredient_id_amount['id']
-                ),
-                amount=ingredient_id_amount['amount']
+                ingredient_id=ingredient_id,
+                amount=amount
             )
-            for ingredient_id_amount in ingredients_amount
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id not in kept_rows
         )
+        return old_amounts, new_amounts
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients_amount = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
-        self.recipe_ingredient_amount_bulk_create(
+        self.set_recipe_ingredients(
             recipe=recipe, ingredients_amount=ingredients_amount
         )
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags')
         ingredients_amount = validated_data.pop('ingredients')
+        utils.lock_recipes([instance.id])
         instance.tags.set(tags)
-        RecipeIngredientAmount.objects.filter(recipe=instance).delete()
-        self.recipe_ingredient_amount_bulk_create(
-            recipe=instance, ingredients_amount=ingredients_amount
+        old_amounts, new_amounts = self.set_recipe_ingredients(
+            recipe=instance,
+            ingredients_amount=ingredients_amount,
+            old_rows=RecipeIngredientAmount.objects.filter(
+                recipe=instance
+            ).order_by()
+        )
+        utils.change_recipe_in_shoppinglists(
+            recipe=instance,
+            old_amounts=old_amounts,
+            new_amounts=new_amounts
         )
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance],
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredientAmount.objects.select_related(
+                    'ingredient'
+                )
+            )
+        )
         return RecipeToRepresentationSerializer(
             instance, context=self.context
         ).data
 
 
 class UserRecipesSerializer(serializers.ModelSerializer):
+    image_renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -232,13 +415,24 @@ class UserRecipesSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'image_renditions',
             'cooking_time'
         )
 
+    def get_image_renditions(self, recipe):
+        return get_image_renditions(recipe, self.context.get('request'))
+
+
+def get_recipes_limit(request):
+    recipes_limit = request.GET.get('recipes_limit')
+    if recipes_limit is not None and recipes_limit.isdigit():
+        return int(recipes_limit)
+    return None
+
 
 class SubscriptionsSerializer(BaseUsersSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(source='recipes.count')
+    recipes_count = serializers.SerializerMethodField()
 
     class Meta(BaseUsersSerializer.Meta):
         fields = (
@@ -249,15 +443,18 @@ class SubscriptionsSerializer(BaseUsersSerializer):
         read_only_fields = fields
 
     def get_recipes(self, user):
-        recipes_limit = (
-            self.context['request']
-            .GET.get('recipes_limit')
-        )
-        if recipes_limit is not None and recipes_limit.isdigit():
-            recipes_limit = int(recipes_limit)
+        if hasattr(user, 'feed_recipes'):
+            recipes = user.feed_recipes
         else:
-            recipes_limit = None
+            recipes = user.recipes.all()[
+                :get_recipes_limit(self.context['request'])
+            ]
         return UserRecipesSerializer(
-            user.recipes.all()[:recipes_limit],
+            recipes,
             many=True
         ).data
+
+    def get_recipes_count(self, user):
+        if hasattr(user, 'recipes_count'):
+            return user.recipes_count
+        return user.recipes.count()
@@ -0,0 +1,98 @@
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from recipes.models import (
+    Ingredient, Recipe, RecipeIngredientAmount, Tag, User
+)
+
+RECIPES_NUMBER = 60
+RECIPE_INGREDIENTS_NUMBER = 5
+
+
+class RecipesQueriesTest(TestCase):
+    """Число запросов к БД списка рецептов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader',
+            email='reader@example.com',
+            password='reader-password',
+            first_name='Читатель',
+            last_name='Рецептов'
+        )
+        cls.token = Token.objects.create(user=cls.user).key
+        authors = [
+            User.objects.create_user(
+                username=f'author{num}',
+                email=f'author{num}@example.com',
+                password='author-password',
+                first_name='Автор',
+                last_name=str(num)
+            )
+            for num in range(3)
+        ]
+        tags = [
+            Tag.objects.create(
+                name=f'Тег {num}', color=f'#00000{num}', slug=f'tag{num}'
+            )
+            for num in range(2)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Продукт {num}', measurement_unit='г'
+            )
+            for num in range(RECIPE_INGREDIENTS_NUMBER)
+        ]
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                id=num,
+                name=f'Рецепт {num}',
+                author=authors[num % len(authors)],
+                text='Текст рецепта',
+                image='recipes/images/recipe.png',
+                cooking_time=10
+            )
+            for num in range(1, RECIPES_NUMBER + 1)
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=tag.id)
+            for recipe in recipes
+            for tag in tags
+        )
+        RecipeIngredientAmount.objects.bulk_create(
+            RecipeIngredientAmount(
+                recipe=recipe, ingredient=ingredient, amount=10
+            )
+            for recipe in recipes
+            for ingredient in ingredients
+        )
+
+    def count_queries(self, limit, **headers):
+        for cache in caches.all():
+            cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                '/api/recipes/', {'limit': limit}, **headers
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), limit)
+        return len(queries)
+
+    def test_recipes_list_queries_do_not_grow_with_limit(self):
+        for name, headers in (
+            ('anonymous', {}),
+            ('authenticated', {'HTTP_AUTHORIZATION': f'Token {self.token}'}),
+        ):
+            with self.subTest(name):
+                queries = self.count_queries(6, **headers)
+                for cache in caches.all():
+                    cache.clear()
+                with self.assertNumQueries(queries):
+                    response = self.client.get(
+                        '/api/recipes/', {'limit': 50}, **headers
+                    )
+                self.assertEqual(len(response.json()['results']), 50)
@@ -1,5 +1,10 @@
+from pathlib import Path
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.http import FileResponse
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404, render
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
@@ -15,6 +20,11 @@ from rest_framework.response import Response
 
 from . import serializers as api_serializers
 from .filters import IngredientsSearchFilter, RecipesFilter
+from .mixins import (
+    AnonymousResponseCacheMixin,
+    CatalogueCacheMixin,
+    RecipeFragmentCacheMixin
+)
 from .paginators import LimitPageQueryParamsPaginator
 from .permissions import AuthorSafeMethods
 from recipes import models as recipes_models
@@ -23,6 +33,8 @@ from recipes import utils
 SUBSCRIPTION_ERROR = 'Вы уже подписаны на пользователя {name}'
 FAVORITE_ERROR = 'Рецепт {name} уже есть в избранном'
 SHOPPING_CART_ERROR = 'Рецепт {name} уже есть в списке покупок'
+SHOPPINGLIST_FORMAT_ERROR = 'Доступные форматы списка покупок: {formats}'
+DEFAULT_SHOPPINGLIST_FORMAT = 'txt'
 
 User = get_user_model()
 
@@ -30,6 +42,7 @@ User = get_user_model()
 class UsersViewSet(UserViewSet):
     queryset = User.objects.all()
     pagination_class = LimitPageQueryParamsPaginator
+    cursor_ordering = ('email', 'id')
 
     def get_permissions(self):
         if self.action == 'me':
@@ -84,8 +97,18 @@ class UsersViewSet(UserViewSet):
     def subscriptions(self, request):
         subscriptions = User.objects.filter(
             authors__user=request.user
-        )
+        ).with_recipes_count().order_by('email')
         page = self.paginate_queryset(subscriptions)
+        recipes = recipes_models.Recipe.objects.all()
+        recipes_limit = api_serializers.get_recipes_limit(request)
+        if recipes_limit is not None:
+            recipes = recipes.filter(
+                author__in=page
+            ).latest_per_author(recipes_limit)
+        prefetch_related_objects(
+            page,
+            Prefetch('recipes', queryset=recipes, to_attr='feed_recipes')
+        )
         serializer = api_serializers.SubscriptionsSerializer(
             page, many=True, context={'request': request}
         )
@@ -94,25 +117,40 @@ class UsersViewSet(UserViewSet):
         )
 
 
-class TagsViewSet(viewsets.ReadOnlyModelViewSet):
+class TagsViewSet(CatalogueCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = recipes_models.Tag.objects.all()
     serializer_class = api_serializers.TagSerializer
     permission_classes = (AllowAny,)
 
 
-class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientsViewSet(
+    CatalogueCacheMixin, viewsets.ReadOnlyModelViewSet
+):
     queryset = recipes_models.Ingredient.objects.all()
     serializer_class = api_serializers.IngredientSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
     filter_backends = (IngredientsSearchFilter,)
-    search_fields = ('^name',)
+
+    def use_catalogue_cache(self, request):
+        return (
+            super().use_catalogue_cache(request)
+            and not request.query_params.get(
+                IngredientsSearchFilter.search_param, ''
+            ).strip()
+        )
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    AnonymousResponseCacheMixin,
+    RecipeFragmentCacheMixin,
+    viewsets.ModelViewSet
+):
     queryset = recipes_models.Recipe.objects.all()
     serializer_class = api_serializers.RecipeSerializer
+    fragment_serializer_class = api_serializers.RecipeFastReadSerializer
     ordering = ('-pub_date',)
+    cursor_ordering = ('-pub_date', '-id')
     permission_classes = (
         IsAuthenticatedOrReadOnly,
         AuthorSafeMethods
@@ -122,6 +160,12 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filterset_class = RecipesFilter
     filterset_fields = ('tags', 'author')
 
+    def get_queryset(self):
+        recipes = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            return recipes.with_related()
+        return recipes
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
@@ -135,22 +179,24 @@ class RecipeViewSet(viewsets.ModelViewSet):
     ):
         recipe = get_object_or_404(recipes_models.Recipe, id=pk)
         user = request.user
-        if request.method == 'POST':
-            obj, created = object_.objects.get_or_create(
-                recipe=recipe,
-                user=user
-            )
-            if not created:
-                raise ValidationError(
-                    error.format(
-                        name=recipe.name
+        with transaction.atomic():
+            utils.lock_user(user.id)
+            if request.method == 'POST':
+                obj, created = object_.objects.get_or_create(
+                    recipe=recipe,
+                    user=user
+                )
+                if not created:
+                    raise ValidationError(
+                        error.format(
+                            name=recipe.name
+                        )
                     )
+                return Response(
+                    api_serializers.UserRecipesSerializer(recipe).data,
+                    status=status.HTTP_201_CREATED
                 )
-            return Response(
-                api_serializers.UserRecipesSerializer(recipe).data,
-                status=status.HTTP_201_CREATED
-            )
-        get_object_or_404(user_related_objects, recipe=recipe).delete()
+            get_object_or_404(user_related_objects, recipe=recipe).delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -185,28 +231,75 @@ class RecipeViewSet(viewsets.ModelViewSet):
             user_related_objects=request.user.shoppingcarts.all()
         )
 
+    def change_user_recipes(self, request, model):
+        serializer = api_serializers.RecipesIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        statuses = utils.change_user_recipes(
+            model=model,
+            user_id=request.user.id,
+            recipes_ids=serializer.validated_data['recipes'],
+            add=request.method == 'POST'
+        )
+        return Response({
+            'results': [
+                {'id': recipe_id, 'status': recipe_status}
+                for recipe_id, recipe_status in statuses.items()
+            ]
+        })
+
+    @action(
+        methods=['POST', 'DELETE'],
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        url_path='favorite',
+        url_name='favorite-bulk'
+    )
+    def favorite_bulk(self, request):
+        return self.change_user_recipes(request, recipes_models.Favorite)
+
+    @action(
+        methods=['POST', 'DELETE'],
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        url_path='shopping_cart',
+        url_name='shopping_cart-bulk'
+    )
+    def shopping_cart_bulk(self, request):
+        return self.change_user_recipes(
+            request, recipes_models.ShoppingCart
+        )
+
     @action(
         methods=['GET'],
         detail=False,
-        permission_classes=(AuthorSafeMethods,),
+        permission_classes=(IsAuthenticated,),
         url_path='download_shopping_cart',
         url_name='download_shopping_cart'
     )
     def download_shopping_cart(self, request):
-        recipes_names_ids = utils.get_recipes_ids_and_names(user=request.user)
-        ingredients_amount = utils.get_ingredients_amount(
-            recipes_ids=[
-                recipe['recipe__id']
-                for recipe in recipes_names_ids
-            ],
+        file_format = request.query_params.get(
+            'file_format', DEFAULT_SHOPPINGLIST_FORMAT
+        )
+        if file_format not in utils.SHOPPINGLIST_FORMATS:
+            raise ValidationError(
+                SHOPPINGLIST_FORMAT_ERROR.format(
+                    formats=', '.join(utils.SHOPPINGLIST_FORMATS)
+                )
+            )
+        get_shoppinglist, content_type = (
+            utils.SHOPPINGLIST_FORMATS[file_format]
+        )
+        response = StreamingHttpResponse(
+            get_shoppinglist(user=request.user),
+            content_type=content_type
         )
-        return FileResponse(
-            utils.get_shoppinglist(
-                ingredients=ingredients_amount,
-                recipes=recipes_names_ids
-            ),
-            content_type='text/plain; charset=utf-8'
+        file_name = Path(
+            settings.SHOPPINGLIST_FILE_NAME
+        ).with_suffix(f'.{file_format}')
+        response['Content-Disposition'] = (
+            f'attachment; filename="{file_name}"'
         )
+        return response
 
 
 def redoc(request):
@@ -7,6 +7,8 @@ from django.contrib.auth.models import Group
 from . import constants
 from . import models
 from . import filters
+from . import images
+from . import utils
 
 
 User = get_user_model()
@@ -107,14 +109,26 @@ class RecipeAdmin(admin.ModelAdmin):
     filter_horizontal = ('tags',)
     empty_value_display = '-пусто-'
 
+    def save_related(self, request, form, formsets, change):
+        recipe = form.instance
+        utils.lock_recipes([recipe.id])
+        old_amounts = utils.get_recipes_amounts([recipe.id])
+        super().save_related(request, form, formsets, change)
+        utils.change_recipe_in_shoppinglists(
+            recipe=recipe,
+            old_amounts=old_amounts,
+            new_amounts=utils.get_recipes_amounts([recipe.id])
+        )
+
     @admin.display(description='В избранном')
     def favorites(self, recipe):
         return recipe.favorites.count()
 
     @admin.display(description='Изображение')
     def show_image(self, recipe):
+        image_url = images.get_rendition_urls(recipe)['admin']
         return mark_safe(
-            f'<img src="{recipe.image.url}" '
+            f'<img src="{image_url}" '
             f'width="{constants.ADMIN_IMAGE_WIDTH}" '
             f'height="{constants.ADMIN_IMAGE_HEIGHT}px" />'
         )
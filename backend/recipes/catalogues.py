@@ -0,0 +1,30 @@
+from .models import Tag
+from .versions import bump_version_on_commit, get_version
+
+CATALOGUE_VERSION_KEY = 'catalogue-version:{model}'
+
+_tags_ids = (None, {})
+
+
+def get_catalogue_version_key(model):
+    return CATALOGUE_VERSION_KEY.format(model=model._meta.label_lower)
+
+
+def get_catalogue_version(model):
+    """Текущая версия справочника (теги, ингредиенты)."""
+    return get_version(get_catalogue_version_key(model))
+
+
+def bump_catalogue_version(model):
+    bump_version_on_commit(get_catalogue_version_key(model))
+
+
+def get_tags_ids():
+    """Словарь slug -> id тегов из кэша процесса, по версии каталога."""
+    global _tags_ids
+    version = get_catalogue_version(Tag)
+    if _tags_ids[0] != version:
+        _tags_ids = (
+            version, dict(Tag.objects.values_list('slug', 'id'))
+        )
+    return _tags_ids[1]
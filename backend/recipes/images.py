@@ -0,0 +1,141 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from .models import Recipe
+from .versions import bump_recipes_versions
+
+RENDITION_PATH = 'recipes/renditions/{name}/{stem}.{extension}'
+RENDITION_EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_rendition_names(image_name):
+    """Пути рендиций изображения: по одному на IMAGE_RENDITIONS."""
+    stem = PurePosixPath(image_name).stem
+    extension = RENDITION_EXTENSIONS[settings.IMAGE_RENDITION_FORMAT]
+    return {
+        name: RENDITION_PATH.format(
+            name=name, stem=stem, extension=extension
+        )
+        for name in settings.IMAGE_RENDITIONS
+    }
+
+
+def renditions_are_current(recipe):
+    return bool(recipe.image) and recipe.image_renditions == (
+        get_rendition_names(recipe.image.name)
+    )
+
+
+def get_rendition_urls(recipe):
+    """
+    URL рендиций рецепта. Пока рендиции не готовы,
+    вместо каждой отдается исходное изображение.
+    """
+    if not recipe.image:
+        return {name: None for name in settings.IMAGE_RENDITIONS}
+    if not renditions_are_current(recipe):
+        return {name: recipe.image.url for name in settings.IMAGE_RENDITIONS}
+    return {
+        name: Recipe.image.field.storage.url(path)
+        for name, path in recipe.image_renditions.items()
+    }
+
+
+def make_rendition(image, size, crop):
+    if crop:
+        image = ImageOps.fit(image, size, Image.LANCZOS)
+    else:
+        image = image.copy()
+        image.thumbnail(size, Image.LANCZOS)
+    file_format = settings.IMAGE_RENDITION_FORMAT
+    if file_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(
+        buffer, format=file_format, quality=settings.IMAGE_RENDITION_QUALITY
+    )
+    return buffer.getvalue()
+
+
+def save_renditions(image_name):
+    """
+    Строит рендиции изображения, если их еще нет: одинаковые
+    изображения хранятся в одном файле и делят рендиции.
+    """
+    storage = Recipe.image.field.storage
+    names = get_rendition_names(image_name)
+    if all(storage.exists(name) for name in names.values()):
+        return names
+    with storage.open(image_name) as file:
+        image = Image.open(file)
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        for name, options in settings.IMAGE_RENDITIONS.items():
+            storage.replace(
+                names[name], ContentFile(make_rendition(image, **options))
+            )
+    return names
+
+
+def process_recipe_image(recipe_id, image_name):
+    """
+    Строит рендиции изображения рецепта и сохраняет их пути,
+    если изображение рецепта за это время не изменилось.
+    Рендиции, которые больше не нужны, удаляет collect-media.
+    """
+    if not Recipe.objects.filter(id=recipe_id, image=image_name).exists():
+        return
+    if Recipe.objects.filter(
+        id=recipe_id, image=image_name
+    ).update(image_renditions=save_renditions(image_name)):
+        bump_recipes_versions([recipe_id])
+
+
+def run_in_worker(recipe_id, image_name):
+    try:
+        process_recipe_image(recipe_id, image_name)
+    except Exception:
+        logger.exception(
+            'Не удалось обработать изображение %s рецепта %s',
+            image_name, recipe_id
+        )
+    finally:
+        close_old_connections()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_PROCESSING_WORKERS,
+            thread_name_prefix='recipe-images'
+        )
+    return _executor
+
+
+def schedule_image_processing(recipe):
+    """
+    Ставит построение рендиций в пул потоков после фиксации
+    транзакции; при IMAGE_PROCESSING_WORKERS = 0 строит их сразу.
+    """
+    recipe_id, image_name = recipe.id, recipe.image.name
+    if not settings.IMAGE_PROCESSING_WORKERS:
+        transaction.on_commit(
+            lambda: process_recipe_image(recipe_id, image_name)
+        )
+        return
+    transaction.on_commit(
+        lambda: get_executor().submit(run_in_worker, recipe_id, image_name)
+    )
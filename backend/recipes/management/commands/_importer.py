@@ -0,0 +1,293 @@
+import io
+import random
+import time
+from dataclasses import dataclass
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connections, transaction
+
+from . import _load_data
+from recipes.catalogues import bump_catalogue_version
+from recipes.models import (
+    Ingredient, Recipe, RecipeIngredientAmount, Tag, User
+)
+from recipes.versions import bump_recipes_versions
+
+BATCH_SIZE = 5000
+COPY_BATCH_SIZE = 50_000
+COPY_SQL = 'COPY {table} ({columns}) FROM STDIN'
+COPY_ESCAPES = str.maketrans({
+    '\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'
+})
+RECIPE_TAGS_NUMBER = (1, 3)
+RECIPE_INGREDIENTS_NUMBER = (5, 15)
+RECIPE_INGREDIENT_AMOUNT = (3, 20)
+
+
+@dataclass(frozen=True)
+class ImportResult:
+    rows: int
+    created: int
+    seconds: float
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def reset_sequences(model):
+    """
+    Сдвигает последовательность id PostgreSQL за максимальный id:
+    записи с явными id (теги, пользователи, рецепты) ее не двигают.
+    """
+    connection = connections[model.objects.db]
+    statements = connection.ops.sequence_reset_sql(no_style(), [model])
+    if statements:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+
+def get_insert_fields(model, sample):
+    """Поля для вставки; id — только если он задан (в sample)."""
+    return [
+        field for field in model._meta.concrete_fields
+        if not field.primary_key or sample.pk is not None
+    ]
+
+
+def copy_objects(model, objects, connection, batch_size=COPY_BATCH_SIZE):
+    """Вставка объектов objects в PostgreSQL командой COPY."""
+    quote_name = connection.ops.quote_name
+    rows = 0
+    for batch in batched(objects, batch_size):
+        fields = get_insert_fields(model, batch[0])
+        buffer = io.StringIO()
+        for obj in batch:
+            buffer.write('\t'.join(
+                '\\N' if value is None
+                else str(value).translate(COPY_ESCAPES)
+                for value in (
+                    field.get_db_prep_save(
+                        getattr(obj, field.attname), connection
+                    )
+                    for field in fields
+                )
+            ))
+            buffer.write('\n')
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                COPY_SQL.format(
+                    table=quote_name(model._meta.db_table),
+                    columns=', '.join(
+                        quote_name(field.column) for field in fields
+                    )
+                ),
+                buffer
+            )
+        rows += len(batch)
+    return rows
+
+
+def insert_objects(model, objects, batch_size=BATCH_SIZE):
+    """
+    Быстрая вставка объектов objects (итератор) без сигналов и
+    без pre_save полей: значения (в том числе auto_now_add) берутся
+    из объектов как есть. В PostgreSQL — COPY, в других СУБД —
+    многострочные INSERT. Возвращает число вставленных строк.
+    """
+    connection = connections[model.objects.db]
+    if connection.vendor == 'postgresql':
+        return copy_objects(model, objects, connection)
+    rows = 0
+    for batch in batched(objects, batch_size):
+        fields = get_insert_fields(model, batch[0])
+        size = connection.ops.bulk_batch_size(fields, batch) or len(batch)
+        for start in range(0, len(batch), size):
+            model._base_manager._insert(
+                batch[start:start + size],
+                fields=fields,
+                raw=True,
+                using=connection.alias
+            )
+        rows += len(batch)
+    return rows
+
+
+def import_records(model, records, batch_size=BATCH_SIZE, prepare=None):
+    """
+    Вставляет записи records (словари полей) пачками по batch_size
+    через bulk_create(ignore_conflicts=True): записи, которые нарушают
+    уникальность (уже импортированы), пропускаются, поэтому повторный
+    импорт ничего не меняет. prepare(batch) превращает пачку словарей
+    в объекты модели.
+    """
+    if prepare is None:
+        def prepare(batch):
+            return [model(**record) for record in batch]
+    start = time.perf_counter()
+    before = model.objects.count()
+    rows = 0
+    for batch in batched(records, batch_size):
+        rows += len(batch)
+        model.objects.bulk_create(
+            prepare(batch), batch_size=batch_size, ignore_conflicts=True
+        )
+    reset_sequences(model)
+    return ImportResult(
+        rows=rows,
+        created=model.objects.count() - before,
+        seconds=time.perf_counter() - start
+    )
+
+
+def import_ingredients(path=None, batch_size=BATCH_SIZE):
+    result = import_records(
+        Ingredient,
+        _load_data.iter_ingredients(path),
+        batch_size
+    )
+    bump_catalogue_version(Ingredient)
+    bump_recipes_versions(everything=True)
+    return result
+
+
+def import_tags(path=None, batch_size=BATCH_SIZE):
+    result = import_records(
+        Tag, _load_data.iter_tags(path), batch_size
+    )
+    bump_catalogue_version(Tag)
+    bump_recipes_versions(everything=True)
+    return result
+
+
+def prepare_users(batch):
+    """
+    Пользователи пачки, которых еще нет в БД. Пароль хэшируется один
+    раз на каждое различное значение: хэш PBKDF2 — самая долгая часть
+    импорта, а у тестовых пользователей пароли повторяются.
+    """
+    existing = set(
+        User.objects.filter(
+            username__in=[record['username'] for record in batch]
+        ).values_list('username', flat=True)
+    )
+    hashes = {}
+    users = []
+    for record in batch:
+        if record['username'] in existing:
+            continue
+        record = dict(record)
+        password = record.pop('password')
+        if password not in hashes:
+            hashes[password] = make_password(password)
+        users.append(User(**record, password=hashes[password]))
+    return users
+
+
+def import_users(users=None, batch_size=BATCH_SIZE):
+    return import_records(
+        User,
+        _load_data.USERS if users is None else users,
+        batch_size,
+        prepare=prepare_users
+    )
+
+
+def import_recipes(recipes=None, batch_size=BATCH_SIZE):
+    """
+    Рецепты, которых еще нет в БД (по id), со случайными тегами и
+    ингредиентами, без своего изображения — с тестовым. Рецепты
+    создаются по одному, чтобы сработали сигналы изображений;
+    ингредиенты и теги — пачками.
+    """
+    start = time.perf_counter()
+    recipes = _load_data.RECIPES if recipes is None else recipes
+    existing = set(
+        Recipe.objects.filter(
+            id__in=[recipe['id'] for recipe in recipes]
+        ).values_list('id', flat=True)
+    )
+    ingredients_ids = list(Ingredient.objects.values_list('id', flat=True))
+    tags_ids = list(Tag.objects.values_list('id', flat=True))
+    created = []
+    with transaction.atomic():
+        for data in recipes:
+            if data['id'] in existing:
+                continue
+            data = dict(data)
+            data['author_id'] = data.pop('author')
+            if 'image' not in data:
+                data['image'] = _load_data.get_image()
+            created.append(Recipe.objects.create(**data).id)
+        RecipeIngredientAmount.objects.bulk_create(
+            (
+                RecipeIngredientAmount(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=random.randint(*RECIPE_INGREDIENT_AMOUNT)
+                )
+                for recipe_id in created
+                for ingredient_id in random.sample(
+                    ingredients_ids,
+                    min(
+                        random.randint(*RECIPE_INGREDIENTS_NUMBER),
+                        len(ingredients_ids)
+                    )
+                )
+            ),
+            batch_size=batch_size
+        )
+        Recipe.tags.through.objects.bulk_create(
+            (
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in created
+                for tag_id in random.sample(
+                    tags_ids,
+                    min(random.randint(*RECIPE_TAGS_NUMBER), len(tags_ids))
+                )
+            ),
+            batch_size=batch_size
+        )
+        bump_recipes_versions(created)
+    reset_sequences(Recipe)
+    return ImportResult(
+        rows=len(recipes),
+        created=len(created),
+        seconds=time.perf_counter() - start
+    )
+
+
+IMPORTS = {
+    'ingredients': (import_ingredients, 'ингредиентов'),
+    'tags': (import_tags, 'тегов'),
+    'users': (import_users, 'пользователей'),
+    'recipes': (import_recipes, 'рецептов'),
+}
+
+
+def run_import(kind, **options):
+    """Импорт kind из IMPORTS с выводом хода и скорости."""
+    function, name = IMPORTS[kind]
+    print(f'Начало импорта {name}...', end=' ', flush=True)
+    try:
+        result = function(**options)
+    except Exception as error:
+        raise Exception(f'Ошибка импорта {name}: {error}')
+    print('(ok)')
+    print(
+        f'Записей: {result.rows}, создано: {result.created}, '
+        f'{result.seconds:.2f} с, {result.rows_per_second:.0f} записей/с'
+    )
+    print()
+    print(f'Импорт {name} выполнен успешно')
+    return result
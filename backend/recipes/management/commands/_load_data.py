@@ -1,15 +1,15 @@
 import base64
+import csv
 import json
 import os
-import random
+import re
+from functools import lru_cache
 
 from django.conf import settings
 from django.core.files.base import ContentFile
 
-from recipes.models import Ingredient, Tag, User, RecipeIngredientAmount
-
-
 INGREDIENTS_JSON_FILE_NAME = 'ingredients.json'
+INGREDIENTS_CSV_FILE_NAME = 'ingredients.csv'
 TAGS_JSON_FILE_NAME = 'tags.json'
 IMAGE_CODE_FILE_NAME = 'image-code.txt'
 
@@ -17,6 +17,10 @@ PATH_TO_INGREDIENTS_FILE = os.path.join(
     settings.DATA_ROOT, INGREDIENTS_JSON_FILE_NAME
 )
 
+PATH_TO_INGREDIENTS_CSV_FILE = os.path.join(
+    settings.DATA_ROOT, INGREDIENTS_CSV_FILE_NAME
+)
+
 PATH_TO_TAGS_FILE = os.path.join(
     settings.DATA_ROOT, TAGS_JSON_FILE_NAME
 )
@@ -25,6 +29,10 @@ PATH_TO_IMAGE_CODE_FILE = os.path.join(
     settings.DATA_ROOT, IMAGE_CODE_FILE_NAME
 )
 
+INGREDIENTS_CSV_FIELDS = ('name', 'measurement_unit')
+JSON_CHUNK_SIZE = 64 * 1024
+JSON_SEPARATORS = re.compile(r'[\s,]*')
+
 USER_ID_ONE = 20
 USER_ID_TWO = 21
 SUPERUSER_ID = 22
@@ -39,28 +47,87 @@ PASTA_RECIPE_ID = 25
 PELMENI_RECIPE_ID = 26
 
 
-def load_data(path_to):
-    with open(
-        path_to, 'r', encoding="utf8"
-    ) as file:
-        return json.load(file)
+def iter_json_array(path, chunk_size=JSON_CHUNK_SIZE):
+    """
+    Элементы массива JSON из файла path по одному: файл читается
+    кусками по chunk_size символов, а не загружается целиком.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf8') as file:
+        buffer = file.read(chunk_size)
+        position = JSON_SEPARATORS.match(buffer).end()
+        if not buffer.startswith('[', position):
+            raise ValueError(f'{path}: ожидается массив JSON')
+        position += 1
+        while True:
+            position = JSON_SEPARATORS.match(buffer, position).end()
+            if buffer.startswith(']', position):
+                return
+            try:
+                record, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                chunk = file.read(chunk_size)
+                if not chunk:
+                    raise
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            yield record
+
+
+def iter_json_lines(path):
+    with open(path, encoding='utf8') as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_csv_records(path, fieldnames):
+    with open(path, encoding='utf8', newline='') as file:
+        yield from csv.DictReader(file, fieldnames=fieldnames)
+
+
+def iter_records(path, csv_fieldnames=None):
+    """Записи файла path: массив JSON, JSON Lines (.jsonl) или CSV."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return iter_csv_records(path, csv_fieldnames)
+    if extension == '.jsonl':
+        return iter_json_lines(path)
+    return iter_json_array(path)
+
+
+def iter_ingredients(path=None):
+    """
+    Ингредиенты из файла path (по умолчанию data/ingredients.json);
+    файл читается при переборе, а не при импорте модуля.
+    """
+    return iter_records(
+        path or PATH_TO_INGREDIENTS_FILE,
+        csv_fieldnames=INGREDIENTS_CSV_FIELDS
+    )
 
 
-def load_image_file():
-    with open(
-        PATH_TO_IMAGE_CODE_FILE, 'r', encoding="utf8"
-    ) as image:
-        return image.read()
+def iter_tags(path=None):
+    return iter_records(path or PATH_TO_TAGS_FILE)
 
 
-INGREDIENTS = load_data(path_to=PATH_TO_INGREDIENTS_FILE)
-IMAGE_CODE = load_image_file()
-TAGS = load_data(path_to=PATH_TO_TAGS_FILE)
+@lru_cache(maxsize=None)
+def get_image_content():
+    """
+    Расширение и байты тестового изображения из image-code.txt:
+    файл читается и декодируется один раз на процесс.
+    """
+    with open(PATH_TO_IMAGE_CODE_FILE, 'r', encoding='utf8') as image:
+        header, code = image.read().split(';base64,')
+    return header.split('/')[-1], base64.b64decode(code)
+
+
+def get_image():
+    """Новый файл тестового изображения над общими байтами."""
+    extension, content = get_image_content()
+    return ContentFile(content, name=f'temp.{extension}')
 
-TAGS_IDS = [
-    tag['id']
-    for tag in TAGS
-]
 
 USERS = [
     {
@@ -103,55 +170,11 @@ USERS = [
 ]
 
 
-def get_user(user_id):
-    return User.objects.get(id=user_id)
-
-
-def get_tags(*args):
-    return list(Tag.objects.filter(id__in=list(args)))
-
-
-def get_ingredients(*args):
-    return list(Ingredient.objects.filter(id__in=list(args)))
-
-
-def get_image(data=IMAGE_CODE):
-    if isinstance(data, str) and data.startswith('data:image'):
-        format, imgstr = data.split(';base64,')
-        ext = format.split('/')[-1]
-
-        data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-
-    return data
-
-
-def create_ingredients_tags(recipe):
-    k_tags = random.randint(1, 3)
-    recipe.tags.set(
-        get_tags(
-            *random.choices(TAGS_IDS, k=k_tags)
-        )
-    )
-    num_ingredients = random.randint(5, 15)
-    for ingredient in get_ingredients(
-        *[
-            random.randint(1, Ingredient.objects.count())
-            for _ in range(num_ingredients)
-        ]
-    ):
-        RecipeIngredientAmount.objects.create(
-            recipe=recipe,
-            ingredient=ingredient,
-            amount=random.randint(3, 20)
-        )
-
-
 RECIPES = [
     {
         'name': 'Burger',
         'author': SUPERUSER_ID,
         'text': 'The best Burger',
-        'image': get_image(),
         'id': BURGER_RECIPE_ID,
         'cooking_time': 5
     },
@@ -159,7 +182,6 @@ RECIPES = [
         'name': 'Sandwich',
         'author': USER_ID_ONE,
         'text': 'The best Sandwich',
-        'image': get_image(),
         'id': SANDWICH_RECIPE_ID,
         'cooking_time': 11
     },
@@ -167,7 +189,6 @@ RECIPES = [
         'name': 'Kebab',
         'author': USER_ID_TWO,
         'text': 'The best Kebab',
-        'image': get_image(),
         'id': KEBAB_RECIPE_ID,
         'cooking_time': 45
     },
@@ -175,7 +196,6 @@ RECIPES = [
         'name': 'Pasta',
         'author': REVIEW_ID,
         'text': 'The best Pasta',
-        'image': get_image(),
         'id': PASTA_RECIPE_ID,
         'cooking_time': 15
     },
@@ -183,7 +203,6 @@ RECIPES = [
         'name': 'Pelmeni',
         'author': REVIEW_ID,
         'text': 'The best Pelmeni',
-        'image': get_image(),
         'id': PELMENI_RECIPE_ID,
         'cooking_time': 24
     },
@@ -191,7 +210,6 @@ RECIPES = [
         'name': 'Pizza',
         'author': REVIEW_ID,
         'text': 'The best Pizza',
-        'image': get_image(),
         'id': PIZZA_RECIPE_ID,
         'cooking_time': 60
     },
@@ -199,19 +217,7 @@ RECIPES = [
         'name': 'Shakshuka',
         'author': REVIEW_ID,
         'text': 'The best Shakshuka',
-        'image': get_image(),
         'id': SHAKSHUKA_RECIPE_ID,
         'cooking_time': 36
     }
 ]
-
-
-TAGS_DATA_MODEL = (
-    (TAGS, Tag)
-)
-INGREDIENTS_DATA_MODEL = (
-    (INGREDIENTS, Ingredient),
-)
-USER_DATA_MODEL = (
-    (USERS, User),
-)
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from recipes.media import collect_garbage
+
+
+class Command(BaseCommand):
+    help = (
+        'This command deletes recipe images and renditions '
+        'that are not used by any recipe'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать файлы, которые будут удалены'
+        )
+
+    def handle(self, *args, **options):
+        print('Поиск неиспользуемых файлов...', end=' ')
+        deleted = collect_garbage(dry_run=options['dry_run'])
+        print('(ok)')
+        for name in deleted:
+            print(f' - {name}')
+        if options['dry_run']:
+            print(f'Будет удалено файлов: {len(deleted)}')
+        else:
+            print(f'Удалено файлов: {len(deleted)}')
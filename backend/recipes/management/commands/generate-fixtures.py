@@ -0,0 +1,293 @@
+import random
+import time
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import _load_data
+from ._importer import (
+    BATCH_SIZE, import_ingredients, import_tags, insert_objects,
+    reset_sequences
+)
+from recipes.media import change_references
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredientAmount,
+    ShoppingCart,
+    Subscriptions,
+    Tag,
+    User
+)
+from recipes.utils import rebuild_shoppinglists
+from recipes.versions import bump_recipes_versions
+
+RECIPE_TAGS_NUMBER = (1, 3)
+RECIPE_INGREDIENTS_NUMBER = (5, 15)
+RECIPE_INGREDIENT_AMOUNT = (1, 500)
+RECIPE_COOKING_TIME = (5, 180)
+PUB_DATE_SPAN = timedelta(days=365)
+RECIPE_TEXT = 'Сгенерированный рецепт {id}. ' * 5
+MAX_ATTEMPTS_FACTOR = 20
+
+
+class ZipfSampler:
+    """
+    Выбор элементов population с вероятностью ~ 1 / rank ** exponent:
+    немногие элементы (популярные рецепты, активные пользователи)
+    выбираются часто, большинство — редко. Ранги раздаются
+    элементам в случайном порядке генератора rng.
+    """
+
+    def __init__(self, population, exponent, rng):
+        self.population = list(population)
+        rng.shuffle(self.population)
+        self.cum_weights = list(accumulate(
+            1 / rank ** exponent
+            for rank in range(1, len(self.population) + 1)
+        ))
+        self.rng = rng
+
+    def sample(self, k):
+        return self.rng.choices(
+            self.population, cum_weights=self.cum_weights, k=k
+        )
+
+
+def get_next_id(model):
+    return (model.objects.aggregate(max_id=Max('id'))['max_id'] or 0) + 1
+
+
+def generate_pairs(left, right, number, rng, exclude_same=False):
+    """
+    До number различных пар (left, right), обе стороны — по Зипфу.
+    Пар меньше number, если столько различных не набирается.
+    """
+    pairs = set()
+    attempts = 0
+    while len(pairs) < number and attempts < number * MAX_ATTEMPTS_FACTOR:
+        size = number - len(pairs)
+        attempts += size
+        pairs.update(
+            pair for pair in zip(left.sample(size), right.sample(size))
+            if not exclude_same or pair[0] != pair[1]
+        )
+    return sorted(pairs)
+
+
+class Command(BaseCommand):
+    help = (
+        'This command generates a deterministic synthetic dataset '
+        '(users, recipes, ingredients of recipes, favorites, shopping '
+        'carts and subscriptions) with Zipf-distributed popularity'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10_000)
+        parser.add_argument('--favorites', type=int, default=100_000)
+        parser.add_argument('--carts', type=int, default=10_000)
+        parser.add_argument('--subscriptions', type=int, default=10_000)
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Показатель распределения Зипфа'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=1,
+            help='Зерно генератора: одинаковые параметры на одинаковой '
+                 'БД дают одинаковые данные'
+        )
+        parser.add_argument(
+            '--password', default='generated123',
+            help='Пароль всех созданных пользователей'
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def step(self, name, function, *args):
+        print(f'Создание {name}...', end=' ', flush=True)
+        start = time.perf_counter()
+        result = function(*args)
+        seconds = time.perf_counter() - start
+        rows = result if isinstance(result, int) else len(result)
+        print(
+            f'(ok) {rows} записей, {seconds:.2f} с, '
+            f'{rows / seconds if seconds else 0:.0f} записей/с'
+        )
+        return result
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.zipf = options['zipf']
+        self.batch_size = options['batch_size']
+        start = time.perf_counter()
+        if not Ingredient.objects.exists():
+            import_ingredients()
+        if not Tag.objects.exists():
+            import_tags()
+        with transaction.atomic():
+            users_ids = self.step(
+                'пользователей', self.create_users,
+                options['users'], options['password']
+            )
+            recipes_ids = self.step(
+                'рецептов', self.create_recipes, users_ids, options['recipes']
+            )
+            self.step(
+                'ингредиентов рецептов', self.create_recipes_ingredients,
+                recipes_ids
+            )
+            self.step('тегов рецептов', self.create_recipes_tags, recipes_ids)
+            for name, model, number in (
+                ('избранного', Favorite, options['favorites']),
+                ('корзин', ShoppingCart, options['carts']),
+            ):
+                self.step(
+                    name, self.create_user_recipes,
+                    model, users_ids, recipes_ids, number
+                )
+            self.step(
+                'подписок', self.create_subscriptions,
+                users_ids, options['subscriptions']
+            )
+            print('Перестроение списков покупок...', end=' ', flush=True)
+            rebuild_shoppinglists()
+            print('(ok)')
+            bump_recipes_versions(everything=True)
+        print()
+        print(
+            f'Данные сгенерированы за {time.perf_counter() - start:.1f} с'
+        )
+
+    def create_users(self, number, password):
+        first_id = get_next_id(User)
+        password = make_password(password)
+        date_joined = timezone.now()
+        ids = list(range(first_id, first_id + number))
+        insert_objects(
+            User,
+            (
+                User(
+                    id=user_id,
+                    username=f'user{user_id}',
+                    email=f'user{user_id}@example.com',
+                    first_name='Пользователь',
+                    last_name=str(user_id),
+                    password=password,
+                    date_joined=date_joined
+                )
+                for user_id in ids
+            ),
+            self.batch_size
+        )
+        reset_sequences(User)
+        return ids
+
+    def create_recipes(self, users_ids, number):
+        first_id = get_next_id(Recipe)
+        image = Recipe.image.field.storage.save(
+            Recipe.image.field.generate_filename(None, 'generated.png'),
+            _load_data.get_image()
+        )
+        ids = list(range(first_id, first_id + number))
+        authors = ZipfSampler(users_ids, self.zipf, self.rng).sample(number)
+        now = timezone.now()
+        insert_objects(
+            Recipe,
+            (
+                Recipe(
+                    id=recipe_id,
+                    name=f'Рецепт {recipe_id}',
+                    author_id=author_id,
+                    text=RECIPE_TEXT.format(id=recipe_id),
+                    image=image,
+                    cooking_time=self.rng.randint(*RECIPE_COOKING_TIME),
+                    pub_date=now - PUB_DATE_SPAN * (
+                        1 - (recipe_id - first_id) / number
+                    )
+                )
+                for recipe_id, author_id in zip(ids, authors)
+            ),
+            self.batch_size
+        )
+        reset_sequences(Recipe)
+        change_references(image, number)
+        return ids
+
+    def create_recipes_ingredients(self, recipes_ids):
+        ingredients = ZipfSampler(
+            Ingredient.objects.values_list('id', flat=True),
+            self.zipf,
+            self.rng
+        )
+
+        def generate():
+            for recipe_id in recipes_ids:
+                for ingredient_id in set(ingredients.sample(
+                    self.rng.randint(*RECIPE_INGREDIENTS_NUMBER)
+                )):
+                    yield RecipeIngredientAmount(
+                        recipe_id=recipe_id,
+                        ingredient_id=ingredient_id,
+                        amount=self.rng.randint(*RECIPE_INGREDIENT_AMOUNT)
+                    )
+
+        return insert_objects(
+            RecipeIngredientAmount, generate(), self.batch_size
+        )
+
+    def create_recipes_tags(self, recipes_ids):
+        tags_ids = list(Tag.objects.values_list('id', flat=True))
+        return insert_objects(
+            Recipe.tags.through,
+            (
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in recipes_ids
+                for tag_id in self.rng.sample(
+                    tags_ids,
+                    min(
+                        self.rng.randint(*RECIPE_TAGS_NUMBER),
+                        len(tags_ids)
+                    )
+                )
+            ),
+            self.batch_size
+        )
+
+    def create_user_recipes(self, model, users_ids, recipes_ids, number):
+        pairs = generate_pairs(
+            ZipfSampler(users_ids, self.zipf, self.rng),
+            ZipfSampler(recipes_ids, self.zipf, self.rng),
+            number,
+            self.rng
+        )
+        return insert_objects(
+            model,
+            (
+                model(user_id=user_id, recipe_id=recipe_id)
+                for user_id, recipe_id in pairs
+            ),
+            self.batch_size
+        )
+
+    def create_subscriptions(self, users_ids, number):
+        pairs = generate_pairs(
+            ZipfSampler(users_ids, self.zipf, self.rng),
+            ZipfSampler(users_ids, self.zipf, self.rng),
+            number,
+            self.rng,
+            exclude_same=True
+        )
+        return insert_objects(
+            Subscriptions,
+            (
+                Subscriptions(user_id=user_id, author_id=author_id)
+                for user_id, author_id in pairs
+            ),
+            self.batch_size
+        )
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ._importer import BATCH_SIZE, IMPORTS, run_import
+
+
+class Command(BaseCommand):
+    help = (
+        'This command imports ingredients, tags, users and recipes '
+        '(all of them in this order by default) in batches; '
+        'already imported records are skipped'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'kinds', nargs='*',
+            help=f'Что импортировать: {", ".join(IMPORTS)} '
+                 f'(по умолчанию — все)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Размер пачки bulk_create'
+        )
+        parser.add_argument(
+            '--ingredients-file',
+            help='Файл ингредиентов: массив JSON, JSON Lines (.jsonl) '
+                 'или CSV (.csv, колонки name,measurement_unit)'
+        )
+        parser.add_argument(
+            '--tags-file', help='Файл тегов: массив JSON или JSON Lines'
+        )
+
+    def handle(self, *args, **options):
+        paths = {
+            'ingredients': options['ingredients_file'],
+            'tags': options['tags_file'],
+        }
+        kinds = options['kinds'] or list(IMPORTS)
+        unknown = set(kinds) - set(IMPORTS)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные данные: {", ".join(sorted(unknown))}'
+            )
+        for kind in IMPORTS:
+            if kind not in kinds:
+                continue
+            kind_options = {'batch_size': options['batch_size']}
+            if kind in paths:
+                kind_options['path'] = paths[kind]
+            run_import(kind, **kind_options)
+            print()
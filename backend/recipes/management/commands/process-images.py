@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import process_recipe_image, renditions_are_current
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'This command builds missing image renditions of recipes '
+        'or rebuilds all of them (--all)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Перестроить рендиции всех рецептов'
+        )
+
+    def handle(self, *args, **options):
+        print('Построение рендиций изображений...', end=' ')
+        processed = 0
+        for recipe in Recipe.objects.exclude(image='').only(
+            'id', 'image', 'image_renditions'
+        ).iterator():
+            if options['all'] or not renditions_are_current(recipe):
+                process_recipe_image(recipe.id, recipe.image.name)
+                processed += 1
+        print('(ok)')
+        print(f'Обработано рецептов: {processed}')
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import ShoppingListItem
+from recipes.utils import get_live_shoppinglists, rebuild_shoppinglists
+
+
+def get_shoppinglists_mismatches():
+    live = get_live_shoppinglists()
+    stored = {
+        (user_id, ingredient_id): amount
+        for user_id, ingredient_id, amount in (
+            ShoppingListItem.objects.values_list(
+                'user', 'ingredient', 'amount'
+            ).iterator()
+        )
+    }
+    return {
+        key: (stored.get(key), live.get(key))
+        for key in live.keys() | stored.keys()
+        if stored.get(key) != live.get(key)
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'This command rebuilds shopping lists from shopping carts '
+        'or checks them against the live computation (--check)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить списки покупок, не перестраивая их'
+        )
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            print('Перестроение списков покупок...', end=' ')
+            rebuild_shoppinglists()
+            print('(ok)')
+        mismatches = get_shoppinglists_mismatches()
+        for (user_id, ingredient_id), (stored, live) in mismatches.items():
+            print(
+                f'user={user_id} ingredient={ingredient_id}: '
+                f'сохранено {stored}, должно быть {live}'
+            )
+        if mismatches:
+            raise CommandError(
+                f'Расхождений в списках покупок: {len(mismatches)}'
+            )
+        print('Списки покупок совпадают с корзинами')
@@ -0,0 +1,84 @@
+import posixpath
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .images import get_rendition_names
+from .models import MediaFile, Recipe
+
+IMAGES_DIRECTORY = Recipe.image.field.upload_to
+
+
+def change_references(name, delta):
+    """Меняет на delta число рецептов, использующих файл name."""
+    if not name:
+        return
+    with transaction.atomic():
+        if delta > 0:
+            MediaFile.objects.bulk_create(
+                [MediaFile(name=name)], ignore_conflicts=True
+            )
+        MediaFile.objects.filter(
+            name=name, references__gte=max(-delta, 0)
+        ).update(references=F('references') + delta)
+
+
+def get_referenced_names():
+    """
+    Файлы изображений, на которые ссылаются рецепты (по счетчикам
+    и, на случай их расхождения, по самим рецептам), и их рендиции.
+    """
+    images = set(
+        MediaFile.objects.filter(
+            references__gt=0
+        ).values_list('name', flat=True).iterator()
+    )
+    images.update(
+        Recipe.objects.exclude(
+            image=''
+        ).values_list('image', flat=True).iterator()
+    )
+    names = set(images)
+    for name in images:
+        names.update(get_rendition_names(name).values())
+    return names
+
+
+def iter_media_names(storage):
+    directories = [IMAGES_DIRECTORY.rstrip('/')]
+    directories += [
+        posixpath.dirname(name)
+        for name in get_rendition_names('').values()
+    ]
+    for directory in directories:
+        if not storage.exists(directory):
+            continue
+        for file_name in storage.listdir(directory)[1]:
+            yield posixpath.join(directory, file_name)
+
+
+def collect_garbage(dry_run=False):
+    """
+    Удаляет файлы изображений и рендиций, на которые не ссылается
+    ни один рецепт и которые не менялись дольше MEDIA_GC_GRACE_PERIOD
+    секунд, а также записи MediaFile без ссылок.
+    Возвращает имена удаленных файлов.
+    """
+    storage = Recipe.image.field.storage
+    referenced = get_referenced_names()
+    border = timezone.now() - timedelta(
+        seconds=settings.MEDIA_GC_GRACE_PERIOD
+    )
+    deleted = []
+    for name in iter_media_names(storage):
+        if name in referenced or storage.get_modified_time(name) > border:
+            continue
+        if not dry_run:
+            storage.delete(name)
+        deleted.append(name)
+    if not dry_run:
+        MediaFile.objects.filter(references=0).delete()
+    return deleted
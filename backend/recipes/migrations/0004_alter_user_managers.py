@@ -0,0 +1,20 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:37
+
+from django.db import migrations
+import recipes.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_alter_recipe_pub_date'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', recipes.models.FoodgramUserManager()),
+            ],
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:40
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+import django.db.models.deletion
+
+
+def fill_shoppinglists(apps, schema_editor):
+    RecipeIngredientAmount = apps.get_model(
+        'recipes', 'RecipeIngredientAmount'
+    )
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    ShoppingListItem.objects.bulk_create(
+        (
+            ShoppingListItem(
+                user_id=item['recipe__shoppingcarts__user'],
+                ingredient_id=item['ingredient'],
+                amount=item['total']
+            )
+            for item in RecipeIngredientAmount.objects.filter(
+                recipe__shoppingcarts__isnull=False
+            ).values(
+                'recipe__shoppingcarts__user', 'ingredient'
+            ).annotate(total=Sum('amount')).order_by().iterator()
+        ),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_alter_user_managers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField(default=0, verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shoppinglist_items', to='recipes.ingredient', verbose_name='Продукт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shoppinglist_items', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Продукт списка покупок',
+                'verbose_name_plural': 'Продукты списка покупок',
+                'ordering': ('ingredient__name', 'ingredient__measurement_unit'),
+                'default_related_name': 'shoppinglist_items',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistitem',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shoppinglist_user_ingredient'),
+        ),
+        migrations.RunPython(fill_shoppinglists, migrations.RunPython.noop),
+    ]
@@ -1,12 +1,25 @@
 from django.conf import settings
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.core.validators import MinValueValidator, RegexValidator
 from django.db import models
+from django.db.models import Count, F, Prefetch, Subquery, Window
+from django.db.models.functions import RowNumber
 
 from . import constants
+from .storage import ContentAddressedStorage
 from .validators import username_validator
 
 
+class UserQuerySet(models.QuerySet):
+
+    def with_recipes_count(self):
+        return self.annotate(recipes_count=Count('recipes'))
+
+
+class FoodgramUserManager(UserManager.from_queryset(UserQuerySet)):
+    pass
+
+
 class User(AbstractUser):
     username = models.CharField(
         verbose_name='Имя пользователя',
@@ -40,6 +53,8 @@ class User(AbstractUser):
         'first_name'
     ]
 
+    objects = FoodgramUserManager()
+
     class Meta:
         ordering = ('email',)
         verbose_name = 'Пользователь'
@@ -71,6 +86,12 @@ class Subscriptions(models.Model):
                 name='unique_user_author'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='subscriptions_author_user_idx'
+            )
+        ]
 
     def __str__(self):
         return f'{self.user} -> {self.author}'
@@ -133,6 +154,60 @@ class Ingredient(models.Model):
         return f'{self.name} {self.measurement_unit}'
 
 
+def get_recipe_related_lookups():
+    """Связанные объекты, которые выводятся вместе с рецептом."""
+    return (
+        'tags',
+        'author',
+        Prefetch(
+            'recipe_ingredients',
+            queryset=RecipeIngredientAmount.objects.select_related(
+                'ingredient'
+            )
+        )
+    )
+
+
+class RankedIds(Subquery):
+    """
+    id строк подзапроса с номером row_number не больше limit. Подзапрос
+    компилируется вместе с внешним запросом, на его соединении с БД.
+    """
+    template = (
+        '(SELECT id FROM (%(subquery)s) AS ranked '
+        'WHERE row_number <= %(limit)d)'
+    )
+
+
+class RecipeQuerySet(models.QuerySet):
+
+    def with_related(self):
+        """
+        Подгружает все связанные объекты рецептов
+        фиксированным числом запросов.
+        """
+        return self.prefetch_related(*get_recipe_related_lookups())
+
+    def latest_per_author(self, limit):
+        """
+        Не более limit последних рецептов каждого автора.
+        Ранжирование выполняется одним запросом через
+        ROW_NUMBER() OVER (PARTITION BY author).
+        """
+        return self.model.objects.using(self._db).filter(
+            id__in=RankedIds(
+                self.annotate(
+                    row_number=Window(
+                        expression=RowNumber(),
+                        partition_by=F('author'),
+                        order_by=(F('pub_date').desc(), F('id').desc())
+                    )
+                ).order_by().values('id', 'row_number'),
+                limit=int(limit)
+            )
+        )
+
+
 class Recipe(models.Model):
     name = models.CharField(
         verbose_name='Название блюда',
@@ -148,8 +223,15 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to='recipes/images/',
+        storage=ContentAddressedStorage(),
         verbose_name='Изображение'
     )
+    image_renditions = models.JSONField(
+        verbose_name='Рендиции изображения',
+        default=dict,
+        blank=True,
+        editable=False
+    )
     tags = models.ManyToManyField(
         to=Tag,
         verbose_name='Теги'
@@ -169,6 +251,8 @@ class Recipe(models.Model):
         auto_now_add=True,
     )
 
+    objects = RecipeQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
@@ -180,6 +264,16 @@ class Recipe(models.Model):
                 name='unique_name_author'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='recipe_author_pub_date_idx'
+            )
+        ]
 
     def __str__(self):
         return self.name
@@ -238,6 +332,12 @@ class BaseUserRecipeModel(models.Model):
                 name=f'{"%(class)s"}_unique_user_recipe'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'],
+                name='%(class)s_recipe_user_idx'
+            )
+        ]
 
     def __str__(self):
         return f'{self.user.username} -> {self.recipe.name}'
@@ -255,3 +355,63 @@ class ShoppingCart(BaseUserRecipeModel):
     class Meta(BaseUserRecipeModel.Meta):
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Список покупок'
+
+
+class ShoppingListItem(models.Model):
+    """
+    Материализованная сумма ингредиента по всем рецептам
+    списка покупок пользователя.
+    """
+    user = models.ForeignKey(
+        to=User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        to=Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Продукт'
+    )
+    amount = models.IntegerField(
+        verbose_name='Количество',
+        default=0
+    )
+
+    class Meta:
+        verbose_name = 'Продукт списка покупок'
+        verbose_name_plural = 'Продукты списка покупок'
+        default_related_name = 'shoppinglist_items'
+        ordering = ('ingredient__name', 'ingredient__measurement_unit')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shoppinglist_user_ingredient'
+            )
+        ]
+
+    def __str__(self):
+        return (
+            f'{self.user.username} -> '
+            f'{self.ingredient.name} {self.amount}'
+        )
+
+
+class MediaFile(models.Model):
+    """Число рецептов, использующих файл хранилища."""
+    name = models.CharField(
+        verbose_name='Путь',
+        max_length=255,
+        unique=True
+    )
+    references = models.PositiveIntegerField(
+        verbose_name='Число ссылок',
+        default=0
+    )
+
+    class Meta:
+        verbose_name = 'Медиафайл'
+        verbose_name_plural = 'Медиафайлы'
+        ordering = ('name',)
+
+    def __str__(self):
+        return f'{self.name} ({self.references})'
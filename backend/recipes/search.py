@@ -0,0 +1,88 @@
+from bisect import bisect_left
+from itertools import islice
+
+from django.db import connections
+
+from .catalogues import get_catalogue_version
+from .models import Ingredient
+
+_ingredient_index = None
+
+
+class IngredientPrefixIndex:
+    """
+    Каталог ингредиентов в памяти процесса, отсортированный по имени
+    в нижнем регистре: префиксный поиск — бинарный поиск по массиву.
+    """
+
+    def __init__(self, ingredients, version=None):
+        self.version = version
+        self.rows = sorted(
+            (name.lower(), id_, name, measurement_unit)
+            for id_, name, measurement_unit in ingredients
+        )
+        self.names = [row[0] for row in self.rows]
+
+    def search(self, query, limit):
+        query = query.lower()
+        prefix_rows = []
+        for row in islice(
+            self.rows, bisect_left(self.names, query), None
+        ):
+            if len(prefix_rows) == limit or not row[0].startswith(query):
+                break
+            prefix_rows.append(row)
+        substring_rows = islice(
+            (
+                row for row in self.rows
+                if query in row[0] and not row[0].startswith(query)
+            ),
+            limit - len(prefix_rows)
+        )
+        return [
+            Ingredient(id=id_, name=name, measurement_unit=measurement_unit)
+            for _, id_, name, measurement_unit in (
+                *prefix_rows, *substring_rows
+            )
+        ]
+
+
+def get_ingredient_index():
+    """Индекс перестраивается при смене версии каталога ингредиентов."""
+    global _ingredient_index
+    version = get_catalogue_version(Ingredient)
+    if _ingredient_index is None or _ingredient_index.version != version:
+        _ingredient_index = IngredientPrefixIndex(
+            Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            ).order_by().iterator(),
+            version=version
+        )
+    return _ingredient_index
+
+
+def search_ingredients_in_db(ingredients, query, limit):
+    """
+    Поиск для PostgreSQL: префикс по индексу text_pattern_ops,
+    затем подстрока по триграммному индексу (миграция 0006).
+    """
+    found = list(ingredients.filter(name__istartswith=query)[:limit])
+    if len(found) < limit:
+        found.extend(
+            ingredients.filter(
+                name__icontains=query
+            ).exclude(
+                name__istartswith=query
+            )[:limit - len(found)]
+        )
+    return found
+
+
+def search_ingredients(ingredients, query, limit):
+    """
+    Не более limit ингредиентов, имя которых содержит query:
+    сначала совпадения по началу имени, затем остальные.
+    """
+    if connections[ingredients.db].vendor == 'postgresql':
+        return search_ingredients_in_db(ingredients, query, limit)
+    return get_ingredient_index().search(query, limit)
@@ -0,0 +1,141 @@
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from .catalogues import bump_catalogue_version
+from .images import renditions_are_current, schedule_image_processing
+from .media import change_references
+from .models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredientAmount,
+    ShoppingCart,
+    Subscriptions,
+    Tag,
+    User
+)
+from .user_state import bump_user_state_version
+from .versions import bump_recipes_versions
+from .utils import (
+    change_shoppinglists,
+    get_recipes_amounts,
+    lock_recipes,
+    user_recipes_signals_muted
+)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_recipe_to_shoppinglist(sender, instance, created, **kwargs):
+    if not created:
+        return
+    with transaction.atomic():
+        lock_recipes([instance.recipe_id])
+        change_shoppinglists(
+            users_ids=[instance.user_id],
+            amounts=get_recipes_amounts([instance.recipe_id])
+        )
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_recipe_from_shoppinglist(sender, instance, **kwargs):
+    if user_recipes_signals_muted():
+        return
+    with transaction.atomic():
+        lock_recipes([instance.recipe_id])
+        amounts = get_recipes_amounts([instance.recipe_id])
+        change_shoppinglists(
+            users_ids=[instance.user_id],
+            amounts={
+                ingredient_id: -amount
+                for ingredient_id, amount in amounts.items()
+            }
+        )
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_save, sender=Subscriptions)
+@receiver(post_delete, sender=Subscriptions)
+def change_user_state_version(sender, instance, **kwargs):
+    if user_recipes_signals_muted():
+        return
+    bump_user_state_version(instance.user_id)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def change_catalogue_version(sender, **kwargs):
+    bump_catalogue_version(sender)
+    bump_recipes_versions(everything=True)
+
+
+@receiver(post_save, sender=Recipe)
+def process_recipe_image(sender, instance, raw=False, **kwargs):
+    if not raw and instance.image and not renditions_are_current(instance):
+        schedule_image_processing(instance)
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_recipe_image(sender, instance, **kwargs):
+    instance._stored_image = None if instance.pk is None else (
+        Recipe.objects.filter(
+            pk=instance.pk
+        ).values_list('image', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def count_recipe_image_references(sender, instance, **kwargs):
+    stored_image = getattr(instance, '_stored_image', None)
+    if instance.image.name != stored_image:
+        change_references(instance.image.name, 1)
+        change_references(stored_image, -1)
+
+
+@receiver(post_delete, sender=Recipe)
+def release_recipe_image(sender, instance, **kwargs):
+    change_references(instance.image.name, -1)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def change_recipe_version(sender, instance, **kwargs):
+    bump_recipes_versions([instance.id])
+
+
+@receiver(post_save, sender=RecipeIngredientAmount)
+@receiver(post_delete, sender=RecipeIngredientAmount)
+def change_recipe_ingredients_version(sender, instance, **kwargs):
+    bump_recipes_versions([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def change_recipe_tags_version(sender, instance, action, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if isinstance(instance, Recipe):
+        bump_recipes_versions([instance.id])
+    else:
+        bump_recipes_versions(everything=True)
+
+
+@receiver(post_save, sender=User)
+def change_author_recipes_version(
+    sender, instance, created, update_fields, **kwargs
+):
+    if created or (
+        update_fields is not None and set(update_fields) <= {'last_login'}
+    ):
+        return
+    recipes_ids = list(
+        Recipe.objects.filter(author=instance).values_list('id', flat=True)
+    )
+    if recipes_ids:
+        bump_recipes_versions(recipes_ids)
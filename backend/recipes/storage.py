@@ -0,0 +1,68 @@
+import hashlib
+import os
+import posixpath
+from tempfile import NamedTemporaryFile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def get_content_hash(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Файловое хранилище, в котором имя файла — SHA-256 его содержимого.
+    Одинаковые файлы хранятся один раз: если файл с таким хэшем уже
+    есть, запись пропускается (обновляется только время изменения,
+    чтобы его не удалил collect-media).
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        directory = posixpath.dirname(name)
+        extension = posixpath.splitext(name)[1].lower()
+        name = posixpath.join(
+            directory, f'{get_content_hash(content)}{extension}'
+        )
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            os.utime(full_path)
+            return name
+        return self.replace(name, content)
+
+    def replace(self, name, content):
+        """
+        Записывает файл под именем name во временный файл и атомарно
+        переименовывает: параллельная запись того же файла просто
+        перезапишет его, а читатели не увидят его недописанным.
+        """
+        full_path = self.path(name)
+        os.makedirs(
+            os.path.dirname(full_path),
+            mode=self.directory_permissions_mode or 0o777,
+            exist_ok=True
+        )
+        with NamedTemporaryFile(
+            dir=os.path.dirname(full_path), delete=False
+        ) as temporary_file:
+            try:
+                for chunk in content.chunks():
+                    temporary_file.write(chunk)
+            except Exception:
+                os.unlink(temporary_file.name)
+                raise
+        os.chmod(temporary_file.name, self.file_permissions_mode or 0o644)
+        os.replace(temporary_file.name, full_path)
+        return name
@@ -0,0 +1,85 @@
+from array import array
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Favorite, ShoppingCart, Subscriptions
+from .versions import (
+    bump_counts_version, bump_version_on_commit, get_version
+)
+
+USER_STATE_VERSION_KEY = 'user-state-version:{user_id}'
+USER_STATE_KEY = 'user-state:{user_id}:{version}'
+
+
+@dataclass(frozen=True)
+class UserState:
+    """ID избранных рецептов, рецептов корзины и авторов подписок."""
+    favorites: frozenset = frozenset()
+    shopping_cart: frozenset = frozenset()
+    subscriptions: frozenset = frozenset()
+
+
+ANONYMOUS_STATE = UserState()
+
+
+def get_user_state_version(user_id):
+    return get_version(USER_STATE_VERSION_KEY.format(user_id=user_id))
+
+
+def bump_user_state_version(user_id):
+    bump_version_on_commit(USER_STATE_VERSION_KEY.format(user_id=user_id))
+    transaction.on_commit(bump_counts_version)
+
+
+def load_user_state(user_id):
+    return (
+        array('q', Favorite.objects.filter(
+            user=user_id
+        ).values_list('recipe', flat=True).order_by()),
+        array('q', ShoppingCart.objects.filter(
+            user=user_id
+        ).values_list('recipe', flat=True).order_by()),
+        array('q', Subscriptions.objects.filter(
+            user=user_id
+        ).values_list('author', flat=True).order_by()),
+    )
+
+
+def get_cached_user_state(user_id):
+    """
+    Состояние пользователя из кэша Django (компактные массивы ID) на
+    USER_STATE_CACHE_TIMEOUT секунд; при 0 — всегда из БД. Записи в
+    избранное, корзину и подписки меняют версию и так сбрасывают кэш.
+    """
+    timeout = settings.USER_STATE_CACHE_TIMEOUT
+    if not timeout:
+        return load_user_state(user_id)
+    key = USER_STATE_KEY.format(
+        user_id=user_id, version=get_user_state_version(user_id)
+    )
+    state = cache.get(key)
+    if state is None:
+        state = load_user_state(user_id)
+        cache.set(key, state, timeout)
+    return state
+
+
+def get_user_state(request):
+    """
+    Состояние пользователя запроса, загружается один раз за запрос.
+    Для анонимных запросов (без токена) все множества пустые.
+    """
+    state = getattr(request, '_foodgram_user_state', None)
+    if state is None:
+        if request.auth is None:
+            state = ANONYMOUS_STATE
+        else:
+            state = UserState(*(
+                frozenset(ids)
+                for ids in get_cached_user_state(request.user.id)
+            ))
+        request._foodgram_user_state = state
+    return state
@@ -1,63 +1,376 @@
+import csv
+import io
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime
+from functools import lru_cache
 
 from django.conf import settings
-from django.db.models import Sum
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen.canvas import Canvas
 
-from .models import RecipeIngredientAmount
+from .models import (
+    Recipe, RecipeIngredientAmount, ShoppingCart, ShoppingListItem, User
+)
+from .user_state import bump_user_state_version
 
 
-SHOPPINGLIST = (
+SHOPPINGLIST_HEADER = (
     'СПИСОК ПОКУПОК\n'
     'Дата составления списка: {date}\n'
     '=========================================\n'
     'РЕЦЕПТЫ:\n'
-    '{recipes}\n\n'
+)
+SHOPPINGLIST_PRODUCTS_HEADER = (
+    '\n\n'
     'ПРОДУКТЫ:\n'
-    '{products}\n'
+)
+SHOPPINGLIST_FOOTER = (
+    '\n'
     '========================================='
 )
+SHOPPINGLIST_RECIPE = ' - {name}'
+SHOPPINGLIST_PRODUCT = '{num}. {name} ({measurement_unit}) {amount} '
+SHOPPINGLIST_CSV_HEADER = (
+    '№',
+    'Продукт',
+    'Единица измерения',
+    'Количество'
+)
+SHOPPINGLIST_PDF_FONT_NAME = 'DejaVuSans'
+SHOPPINGLIST_PDF_FONT_SIZE = 11
+SHOPPINGLIST_PDF_LEADING = 16
+SHOPPINGLIST_PDF_MARGIN = 20 * mm
+SHOPPINGLIST_PDF_CHUNK_SIZE = 64 * 1024
+RECIPE_ADDED = 'added'
+RECIPE_ALREADY_ADDED = 'already_added'
+RECIPE_REMOVED = 'removed'
+RECIPE_NOT_ADDED = 'not_added'
+RECIPE_NOT_FOUND = 'not_found'
+
+_user_recipes_signals_muted = ContextVar(
+    'user_recipes_signals_muted', default=False
+)
 
 
-def get_recipes_ids_and_names(user):
+def get_recipes_names(user):
     return (
-        user.shoppingcarts.select_related(
-            'recipe'
-        ).values('recipe__id', 'recipe__name')
+        user.shoppingcarts.values_list(
+            'recipe__name', flat=True
+        ).order_by('recipe__name').iterator()
     )
 
 
-def get_ingredients_amount(recipes_ids: list) -> list:
-    return [
-        f'{num}. '
-        f'{ingredient["ingredient__name"].capitalize()} '
-        f'({ingredient["ingredient__measurement_unit"]}) '
-        f'{ingredient["amount"]} '
-        for num, ingredient in enumerate(
+def get_ingredients_amount(user):
+    """Готовые суммы ингредиентов из материализованного списка покупок."""
+    return (
+        user.shoppinglist_items.values(
+            'ingredient__name',
+            'ingredient__measurement_unit',
+            'amount'
+        ).iterator()
+    )
+
+
+def get_recipes_amounts(recipes_ids):
+    """Количество каждого ингредиента в сумме по рецептам recipes_ids."""
+    return Counter(dict(
+        RecipeIngredientAmount.objects.filter(
+            recipe__in=recipes_ids
+        ).values('ingredient').annotate(
+            total=Sum('amount')
+        ).order_by().values_list('ingredient', 'total')
+    ))
+
+
+def get_live_shoppinglists():
+    """Суммы ингредиентов списков покупок всех пользователей из корзин."""
+    return {
+        (item['recipe__shoppingcarts__user'], item['ingredient']):
+            item['total']
+        for item in RecipeIngredientAmount.objects.filter(
+            recipe__shoppingcarts__isnull=False
+        ).values(
+            'recipe__shoppingcarts__user', 'ingredient'
+        ).annotate(total=Sum('amount')).order_by().iterator()
+    }
+
+
+def change_shoppinglists(users_ids, amounts):
+    """
+    Прибавляет amounts (ingredient_id -> количество, может быть
+    отрицательным) к спискам покупок пользователей users_ids.
+    """
+    amounts = {
+        ingredient_id: amount
+        for ingredient_id, amount in amounts.items()
+        if amount
+    }
+    users_ids = list(users_ids)
+    if not amounts or not users_ids:
+        return
+    with transaction.atomic():
+        ShoppingListItem.objects.bulk_create(
             (
-                RecipeIngredientAmount.objects.filter(
-                    recipe__in=recipes_ids
-                ).values(
-                    'ingredient__name',
-                    'ingredient__measurement_unit'
-                ).annotate(amount=Sum('amount')).order_by('ingredient')
+                ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id)
+                for user_id in users_ids
+                for ingredient_id, amount in amounts.items()
+                if amount > 0
             ),
-            1
+            ignore_conflicts=True
         )
-    ]
+        items = ShoppingListItem.objects.filter(
+            user__in=users_ids, ingredient__in=amounts
+        )
+        items.update(
+            amount=F('amount') + Case(
+                *(
+                    When(ingredient=ingredient_id, then=Value(amount))
+                    for ingredient_id, amount in amounts.items()
+                ),
+                default=Value(0),
+                output_field=IntegerField()
+            )
+        )
+        items.filter(amount__lte=0).delete()
+
+
+def change_recipe_in_shoppinglists(recipe, old_amounts, new_amounts):
+    """Переносит изменение ингредиентов рецепта в списки покупок."""
+    amounts = Counter(new_amounts)
+    amounts.subtract(old_amounts)
+    change_shoppinglists(
+        users_ids=ShoppingCart.objects.filter(
+            recipe=recipe
+        ).values_list('user', flat=True),
+        amounts=amounts
+    )
+
+
+def lock_user(user_id):
+    """
+    Блокирует строку пользователя до конца транзакции: изменения его
+    избранного и корзины выполняются по очереди.
+    """
+    list(
+        User.objects.select_for_update().filter(
+            id=user_id
+        ).values_list('id', flat=True)
+    )
+
+
+def lock_recipes(recipes_ids):
+    """
+    Блокирует строки рецептов recipes_ids (по порядку id) до конца
+    транзакции: изменение ингредиентов рецепта и добавление его
+    в корзины идут по очереди, и суммы списков покупок не расходятся
+    с корзинами. Возвращает id найденных рецептов.
+    """
+    return set(
+        Recipe.objects.select_for_update().filter(
+            id__in=recipes_ids
+        ).order_by('id').values_list('id', flat=True)
+    )
+
+
+@contextmanager
+def mute_user_recipes_signals():
+    """
+    Внутри блока обработчики сигналов избранного и корзины ничего не
+    делают: список покупок и версию состояния меняет вызывающий код.
+    """
+    token = _user_recipes_signals_muted.set(True)
+    try:
+        yield
+    finally:
+        _user_recipes_signals_muted.reset(token)
+
+
+def user_recipes_signals_muted():
+    return _user_recipes_signals_muted.get()
 
 
-def get_shoppinglist(ingredients, recipes):
-    return SHOPPINGLIST.format(
+def change_user_recipes(model, user_id, recipes_ids, add=True):
+    """
+    Добавляет рецепты recipes_ids в избранное или корзину (model)
+    пользователя user_id или удаляет их оттуда: одна вставка
+    bulk_create или один DELETE ... WHERE id IN (...) в одной
+    транзакции. Параллельные вызовы для одного пользователя
+    выполняются по очереди (блокировка строки пользователя), поэтому
+    изменения списка покупок не задваиваются. Обработчики сигналов
+    моделей при этом молчат, список покупок и версия состояния
+    пользователя меняются здесь. Возвращает статус каждого рецепта:
+    recipe_id -> RECIPE_*.
+    """
+    recipes_ids = list(dict.fromkeys(recipes_ids))
+    with transaction.atomic():
+        lock_user(user_id)
+        if model is ShoppingCart:
+            found = lock_recipes(recipes_ids)
+        else:
+            found = set(
+                Recipe.objects.filter(
+                    id__in=recipes_ids
+                ).values_list('id', flat=True)
+            )
+        user_recipes = model.objects.filter(
+            user=user_id, recipe__in=found
+        ).order_by()
+        present = set(user_recipes.values_list('recipe', flat=True))
+        if add:
+            changed = [
+                recipe_id for recipe_id in recipes_ids
+                if recipe_id in found and recipe_id not in present
+            ]
+            model.objects.bulk_create(
+                model(user_id=user_id, recipe_id=recipe_id)
+                for recipe_id in changed
+            )
+            statuses = (RECIPE_ADDED, RECIPE_ALREADY_ADDED)
+        else:
+            changed = list(present)
+            if changed:
+                with mute_user_recipes_signals():
+                    user_recipes.delete()
+            statuses = (RECIPE_REMOVED, RECIPE_NOT_ADDED)
+        if changed:
+            if model is ShoppingCart:
+                amounts = get_recipes_amounts(changed)
+                change_shoppinglists(
+                    users_ids=[user_id],
+                    amounts=amounts if add else {
+                        ingredient_id: -amount
+                        for ingredient_id, amount in amounts.items()
+                    }
+                )
+            bump_user_state_version(user_id)
+    changed = set(changed)
+    return {
+        recipe_id: (
+            RECIPE_NOT_FOUND if recipe_id not in found
+            else statuses[0] if recipe_id in changed
+            else statuses[1]
+        )
+        for recipe_id in recipes_ids
+    }
+
+
+@transaction.atomic
+def rebuild_shoppinglists():
+    ShoppingListItem.objects.all().delete()
+    ShoppingListItem.objects.bulk_create(
+        (
+            ShoppingListItem(
+                user_id=user_id, ingredient_id=ingredient_id, amount=amount
+            )
+            for (user_id, ingredient_id), amount
+            in get_live_shoppinglists().items()
+        ),
+        batch_size=1000
+    )
+
+
+def join_lines(lines):
+    for num, line in enumerate(lines):
+        yield line if num == 0 else f'\n{line}'
+
+
+def get_shoppinglist_text(user):
+    yield SHOPPINGLIST_HEADER.format(
         date=datetime.now().strftime(
             settings.DATE_FORMAT_FOR_SHOPPINGCART
-        ),
-        recipes=(
-            '\n'.join([
-                f' - {recipe["recipe__name"].capitalize()}'
-                for recipe in recipes
-            ])
-        ),
-        products=(
-            '\n'.join(ingredients)
         )
     )
+    yield from join_lines(
+        SHOPPINGLIST_RECIPE.format(name=name.capitalize())
+        for name in get_recipes_names(user)
+    )
+    yield SHOPPINGLIST_PRODUCTS_HEADER
+    yield from join_lines(
+        SHOPPINGLIST_PRODUCT.format(
+            num=num,
+            name=ingredient['ingredient__name'].capitalize(),
+            measurement_unit=ingredient['ingredient__measurement_unit'],
+            amount=ingredient['amount']
+        )
+        for num, ingredient in enumerate(
+            get_ingredients_amount(user), 1
+        )
+    )
+    yield SHOPPINGLIST_FOOTER
+
+
+class Echo:
+    """Псевдо-буфер: csv.writer сразу возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def get_shoppinglist_csv(user):
+    writer = csv.writer(Echo())
+    yield writer.writerow(SHOPPINGLIST_CSV_HEADER)
+    for num, ingredient in enumerate(get_ingredients_amount(user), 1):
+        yield writer.writerow((
+            num,
+            ingredient['ingredient__name'].capitalize(),
+            ingredient['ingredient__measurement_unit'],
+            ingredient['amount']
+        ))
+
+
+@lru_cache(maxsize=None)
+def get_pdf_font():
+    """Встроенный в PDF шрифт TTF с кириллицей, регистрируется один раз."""
+    pdfmetrics.registerFont(
+        TTFont(
+            SHOPPINGLIST_PDF_FONT_NAME, str(settings.SHOPPINGLIST_PDF_FONT)
+        )
+    )
+    return SHOPPINGLIST_PDF_FONT_NAME
+
+
+def get_shoppinglist_pdf(user):
+    """
+    Список покупок в PDF с теми же строками, что и текстовый, шрифтом
+    со встроенной кириллицей. Готовый документ отдается частями по
+    SHOPPINGLIST_PDF_CHUNK_SIZE байт: таблицу ссылок PDF можно
+    записать только в конце, поэтому он собирается в памяти.
+    """
+    font = get_pdf_font()
+    buffer = io.BytesIO()
+    width, height = A4
+    canvas = Canvas(buffer, pagesize=A4, pageCompression=1)
+    canvas.setTitle(SHOPPINGLIST_HEADER.splitlines()[0])
+    top = height - SHOPPINGLIST_PDF_MARGIN
+    y = top
+    canvas.setFont(font, SHOPPINGLIST_PDF_FONT_SIZE)
+    for line in ''.join(get_shoppinglist_text(user)).splitlines():
+        for part in simpleSplit(
+            line, font, SHOPPINGLIST_PDF_FONT_SIZE,
+            width - 2 * SHOPPINGLIST_PDF_MARGIN
+        ) or ['']:
+            if y < SHOPPINGLIST_PDF_MARGIN:
+                canvas.showPage()
+                canvas.setFont(font, SHOPPINGLIST_PDF_FONT_SIZE)
+                y = top
+            canvas.drawString(SHOPPINGLIST_PDF_MARGIN, y, part)
+            y -= SHOPPINGLIST_PDF_LEADING
+    canvas.save()
+    buffer.seek(0)
+    while chunk := buffer.read(SHOPPINGLIST_PDF_CHUNK_SIZE):
+        yield chunk
+
+
+SHOPPINGLIST_FORMATS = {
+    'txt': (get_shoppinglist_text, 'text/plain; charset=utf-8'),
+    'csv': (get_shoppinglist_csv, 'text/csv; charset=utf-8'),
+    'pdf': (get_shoppinglist_pdf, 'application/pdf'),
+}
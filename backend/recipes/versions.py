@@ -0,0 +1,117 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+
+RECIPES_VERSION_KEY = 'recipes-version:{scope}'
+RECIPE_VERSION_KEY = 'recipe-version:{recipe_id}'
+COUNTS_VERSION_KEY = 'pagination-counts-version'
+
+
+def get_version(key, cache=cache):
+    """
+    Текущая версия по ключу key в кэше Django: при общем бэкенде кэша
+    версия общая для всех процессов. Начальное значение — время, чтобы
+    после вытеснения ключа из кэша версия не совпала ни с одной
+    из прежних.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key, cache=cache):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def bump_version_on_commit(key, cache=cache):
+    """
+    Меняет версию key после фиксации текущей транзакции (вне ее —
+    сразу): иначе параллельный запрос может прочитать еще старые
+    строки и закэшировать их под новой версией.
+    """
+    transaction.on_commit(lambda: bump_version(key, cache))
+
+
+def get_counts_version():
+    """
+    Версия закэшированных чисел объектов пагинации: меняется при любом
+    изменении рецептов и состояния пользователей (избранное, корзина,
+    подписки), от которых зависят числа в списках.
+    """
+    return get_version(COUNTS_VERSION_KEY)
+
+
+def bump_counts_version():
+    bump_version(COUNTS_VERSION_KEY)
+
+
+def get_versions_cache():
+    """Версии рецептов хранятся рядом с закэшированными ответами."""
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def get_recipes_versions(recipe_id=None):
+    """
+    Версии, от которых зависит ответ со списком рецептов
+    (recipe_id is None) или с рецептом recipe_id.
+    """
+    versions_cache = get_versions_cache()
+    keys = [RECIPES_VERSION_KEY.format(scope='all')]
+    if recipe_id is None:
+        keys.append(RECIPES_VERSION_KEY.format(scope='list'))
+    else:
+        keys.append(RECIPE_VERSION_KEY.format(recipe_id=recipe_id))
+    return tuple(get_version(key, versions_cache) for key in keys)
+
+
+def get_recipes_versions_many(recipes_ids):
+    """Версии рецептов recipes_ids: id -> (общая версия, версия рецепта)."""
+    versions_cache = get_versions_cache()
+    all_version = get_version(
+        RECIPES_VERSION_KEY.format(scope='all'), versions_cache
+    )
+    keys = {
+        recipe_id: RECIPE_VERSION_KEY.format(recipe_id=recipe_id)
+        for recipe_id in recipes_ids
+    }
+    versions = versions_cache.get_many(keys.values())
+    return {
+        recipe_id: (
+            all_version,
+            versions[key] if key in versions
+            else get_version(key, versions_cache)
+        )
+        for recipe_id, key in keys.items()
+    }
+
+
+def bump_recipes_versions(recipes_ids=(), everything=False):
+    """
+    После фиксации транзакции меняет версии списка рецептов и
+    рецептов recipes_ids, а при everything — всех рецептов сразу.
+    """
+    recipes_ids = list(recipes_ids)
+
+    def bump():
+        bump_counts_version()
+        versions_cache = get_versions_cache()
+        if everything:
+            bump_version(
+                RECIPES_VERSION_KEY.format(scope='all'), versions_cache
+            )
+            return
+        bump_version(RECIPES_VERSION_KEY.format(scope='list'), versions_cache)
+        for recipe_id in recipes_ids:
+            bump_version(
+                RECIPE_VERSION_KEY.format(recipe_id=recipe_id),
+                versions_cache
+            )
+
+    transaction.on_commit(bump)